@@ -27,16 +27,16 @@
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import project_tests as t
 import pickle
 
+import article_recommendations as ar
+
 get_ipython().run_line_magic('matplotlib', 'inline')
 
-df = pd.read_csv('data/user-item-interactions.csv')
-df_content = pd.read_csv('data/articles_community.csv')
-del df['Unnamed: 0']
-del df_content['Unnamed: 0']
+# parsed once, later runs read the binary copy in data/.cache
+df = ar.load_csv('data/user-item-interactions.csv')
+df_content = ar.load_csv('data/articles_community.csv')
 
 # Show df to get an idea of the data
 df.head()
@@ -136,21 +136,7 @@ max_views = df['article_id'].value_counts().max()
 # No need to change the code here - this will be helpful for later parts of the notebook
 # Run this cell to map the user email to a user_id column and remove the email column
 
-def email_mapper():
-    coded_dict = dict()
-    cter = 1
-    email_encoded = []
-
-    for val in df['email']:
-        if val not in coded_dict:
-            coded_dict[val] = cter
-            cter += 1
-
-        email_encoded.append(coded_dict[val])
-    return email_encoded
-
-
-email_encoded = email_mapper()
+email_encoded = ar.email_mapper(df)
 del df['email']
 df['user_id'] = email_encoded
 
@@ -158,6 +144,19 @@ df['user_id'] = email_encoded
 df.head()
 
 
+# In[ ]:
+
+
+# The user_item matrix and the lookup indexes used by get_user_articles and
+# get_article_names are built from df once, on first use.
+# Set SPARSE_USER_ITEM to True to keep the user_item matrix sparse, the dense pivot
+# does not fit into memory for logs with millions of users
+SPARSE_USER_ITEM = False
+
+data = ar.RecommendationData.from_frames(df, df_content, sparse=SPARSE_USER_ITEM)
+
+
+
 # In[ ]:
 
 
@@ -188,33 +187,11 @@ t.sol_1_test(sol_1_dict)
 # In[ ]:
 
 
-def get_top_articles(n, df=df):
-    '''
-    INPUT:
-    n - (int) the number of top articles to return
-    df - (pandas dataframe) df as defined at the top of the notebook
-
-    OUTPUT:
-    top_articles - (list) A list of the top 'n' article titles
-
-    '''
-    top_n = df['article_id'].value_counts().index[0:n]
-    top_articles = df[df['article_id'].isin(top_n)]['title']
-    return top_articles # Return the top article titles from df (not df_content)
-
-def get_top_article_ids(n, df=df):
-    '''
-    INPUT:
-    n - (int) the number of top articles to return
-    df - (pandas dataframe) df as defined at the top of the notebook
-
-    OUTPUT:
-    top_articles - (list) A list of the top 'n' article titles
+# The articles are ranked by their number of interactions, see
+# article_recommendations.ranking
+get_top_articles = data.get_top_articles
+get_top_article_ids = data.get_top_article_ids
 
-    '''
-    top_articles = (df['article_id'].value_counts().index[0:n])
-
-    return top_articles # Return the top article ids
 
 
 # In[ ]:
@@ -259,26 +236,8 @@ t.sol_2_test(get_top_articles)
 
 # create the user-article matrix with 1's and 0's
 
-def create_user_item_matrix(df):
-    '''
-    INPUT:
-    df - pandas dataframe with article_id, title, user_id columns
-
-    OUTPUT:
-    user_item - user item matrix
-
-    Description:
-    Return a matrix with user ids as rows and article ids on the columns with 1 values where a user interacted with
-    an article and a 0 otherwise
-    '''
-    df['interacted'] = 1
-    user_item = df.groupby(['user_id', 'article_id'])['interacted'].max().unstack()
-    user_item.fillna(0, inplace=True)
-    # Fill in the function here
+user_item = data.user_item
 
-    return user_item # return the user_item matrix
-
-user_item = create_user_item_matrix(df)
 
 
 # In[ ]:
@@ -297,34 +256,8 @@ print("You have passed our quick tests!  Please proceed!")
 # In[ ]:
 
 
-def find_similar_users(user_id, user_item=user_item):
-    '''
-    INPUT:
-    user_id - (int) a user_id
-    user_item - (pandas dataframe) matrix of users by articles:
-                1's when a user has interacted with an article, 0 otherwise
-
-    OUTPUT:
-    similar_users - (list) an ordered list where the closest users (largest dot product users)
-                    are listed first
-
-    Description:
-    Computes the similarity of every pair of users based on the dot product
-    Returns an ordered
-
-    '''
-    # compute similarity of each user to the provided user
-    user = user_item.loc[user_item.index==user_id]
-    dot = user_item.dot(user.T)
-    dot.columns = ['sim']
-    # sort by similarity
-    dot.sort_values(ascending=False, inplace=True, by = ['sim'])
-    # create list of just the ids
-    most_similar_users = list(dot.index)
-    # remove the own user's id
-    most_similar_users.remove(user_id)
-
-    return most_similar_users # return a list of the users in order from most to least similar
+# Similarity is the dot product of two user rows, see article_recommendations.similarity
+find_similar_users = data.find_similar_users
 
 
 
@@ -342,79 +275,11 @@ print("The 3 most similar users to user 46 are: {}".format(find_similar_users(46
 # In[ ]:
 
 
-def get_article_names(article_ids, df=df):
-    '''
-    INPUT:
-    article_ids - (list) a list of article ids
-    df - (pandas dataframe) df as defined at the top of the notebook
-
-    OUTPUT:
-    article_names - (list) a list of article names associated with the list of article ids
-                    (this is identified by the title column)
-    '''
-    article_names = df[df['article_id'].isin(article_ids)]['title']
-    return list(set(article_names))
-
-
-def get_user_articles(user_id, user_item=user_item):
-    '''
-    INPUT:
-    user_id - (int) a user id
-    user_item - (pandas dataframe) matrix of users by articles:
-                1's when a user has interacted with an article, 0 otherwise
-
-    OUTPUT:
-    article_ids - (list) a list of the article ids seen by the user
-    article_names - (list) a list of article names associated with the list of article ids
-                    (this is identified by the doc_full_name column in df_content)
-
-    Description:
-    Provides a list of the article_ids and article titles that have been seen by a user
-    '''
-    # Your code here
-    user = user_item.loc[user_item.index == user_id]
-    article_ids = list(user.columns[np.array(user == 1)[0]])
-    article_ids = [str(x) for x in article_ids]
-    article_names = get_article_names(article_ids)
-    return list(article_ids), article_names # return the ids and names
-
-
-def user_user_recs(user_id, m=10):
-    '''
-    INPUT:
-    user_id - (int) a user id
-    m - (int) the number of recommendations you want for the user
-
-    OUTPUT:
-    recs - (list) a list of recommendations for the user
-
-    Description:
-    Loops through the users based on closeness to the input user_id
-    For each user - finds articles the user hasn't seen before and provides them as recs
-    Does this until m recommendations are found
-
-    Notes:
-    Users who are the same closeness are chosen arbitrarily as the 'next' user
-
-    For the user where the number of recommended articles starts below m
-    and ends exceeding m, the last items are chosen arbitrarily
-
-    '''
-    similar_users = find_similar_users(user_id=user_id)
-    movie_count = 0
-    user = user_item[user_item.index == user_id]
-    seen_articles = set(get_user_articles(user_id)[0])
-    recs = set()
-    for sim_user_id in similar_users:
-        cur_user = user_item[user_item.index == sim_user_id]
-        cur_user_seen = set(get_user_articles(sim_user_id)[0])
-        cur_recs = cur_user_seen - seen_articles
-        recs = recs | cur_recs
-        if len(recs) > m:
-            break
-    return list(recs)[0:m]
-
-
+# Neighbors with the same similarity are taken in user_id order, the articles of the
+# last neighbor needed in article_id order
+get_article_names = data.get_article_names
+get_user_articles = data.get_user_articles
+user_user_recs = data.user_user_recs
 
 
 
@@ -449,106 +314,11 @@ print("If this is all you see, you passed all of our tests!  Nice job!")
 # In[ ]:
 
 
-def get_top_sorted_users(user_id, df=df, user_item=user_item):
-    '''
-    INPUT:
-    user_id - (int)
-    df - (pandas dataframe) df as defined at the top of the notebook
-    user_item - (pandas dataframe) matrix of users by articles:
-            1's when a user has interacted with an article, 0 otherwise
-
-
-    OUTPUT:
-    neighbors_df - (pandas dataframe) a dataframe with:
-                    neighbor_id - is a neighbor user_id
-                    similarity - measure of the similarity of each user to the provided user_id
-                    num_interactions - the number of articles viewed by the user - if a u
-
-    Other Details - sort the neighbors_df by the similarity and then by number of interactions where
-                    highest of each is higher in the dataframe
-
-    '''
-    num_interactions = list(user_item.drop(index=user_id).sum(axis=1))
-    similar_users = find_similar_users(user_id)
-    user = user_item.loc[user_item.index==user_id]
-    dot = user_item.dot(user.T)
-    dot.columns = ['similarity']
-    dot.drop(index=user_id, inplace=True)
-    similarity = list(dot['similarity'])
-    neighbors_df = pd.DataFrame({'neighbor_id': similar_users,
-                                'similarity': similarity,
-                                'num_interactions': num_interactions})
-
-    neighbors_df.sort_values(['similarity', 'num_interactions'], inplace=True,
-                            ascending=False)
-    return neighbors_df # Return the dataframe specified in the doc_string
-
-
-def user_user_recs_part2(user_id, m=10, df=df):
-    '''
-    INPUT:
-    user_id - (int) a user id
-    m - (int) the number of recommendations you want for the user
-
-    OUTPUT:
-    recs - (list) a list of recommendations for the user by article id
-    rec_names - (list) a list of recommendations for the user by article title
-
-    Description:
-    Loops through the users based on closeness to the input user_id
-    For each user - finds articles the user hasn't seen before and provides them as recs
-    Does this until m recommendations are found
-
-    Notes:
-    * Choose the users that have the most total article interactions
-    before choosing those with fewer article interactions.
-
-    * Choose articles with the articles with the most total interactions
-    before choosing those with fewer total interactions.
-
-    '''
-    neighbors_df = get_top_sorted_users(user_id)
-    similar_users = list(neighbors_df['neighbor_id'])
-    user_article_id, user_articles = get_user_articles(user_id)
-    recs = set()
-    for sim_user_id in similar_users:
-        seen_movies = get_user_articles(sim_user_id)[0]
-        cur_recs = set(seen_movies) - set(user_article_id)
-        if (len(recs) + len(cur_recs)) > m:
-            print('add ordered')
-            recs = add_ordered(recs, cur_recs, m)
-            break
-        else:
-            recs = recs | cur_recs
-
-    rec_names = get_article_names(list(recs))
-    len(rec_names)
-    return recs, rec_names
-
-
-
-def add_ordered(recs, cur_recs, m, df=df):
-    print(len(recs))
-    cur_recs = list(cur_recs)
-    recs = list(recs)
-    top_articles = get_top_article_ids(df.shape[0])
-    top_articles = [str(x) for x in top_articles]
-    index_list = [top_articles.index(x) for x in cur_recs]
-    sorted_articles = [x for _, x in sorted(zip(index_list, cur_recs))]
-    sorted_articles
-    for rec in sorted_articles:
-        recs.append(rec)
-        print(len(recs))
-        if len(recs) == m:
-            print('return')
-            break
-    return set(recs)
-
-
-
-
-
-
+# Neighbors are ranked by similarity, then by their number of interactions, and the
+# articles of the last neighbor needed by their popularity, see
+# article_recommendations.similarity and article_recommendations.collaborative
+get_top_sorted_users = data.get_top_sorted_users
+user_user_recs_part2 = data.user_user_recs_part2
 
 
 
@@ -564,6 +334,18 @@ print("The top 10 recommendations for user 20 are the following article names:")
 print(rec_names)
 
 
+# In[ ]:
+
+
+# Batch versions of the functions above, for scoring many users at once (e.g. all of
+# them in a nightly job), see article_recommendations.collaborative. Each row of the
+# result equals the single user call, padded with None
+
+batch_recs = ar.batch_user_user_recs_part2(user_item.index[:5], 10, df=df, user_item=user_item)
+batch_recs
+
+
+
 # `5.` Use your functions from above to correctly fill in the solutions to the dictionary below.  Then test your dictionary against the solution.  Provide the code you need to answer each following the comments below.
 
 # In[ ]:
@@ -623,20 +405,16 @@ print("That's right!  Nice job!")
 # In[ ]:
 
 
-def make_content_recs():
-    '''
-    INPUT:
-
-    OUTPUT:
-
-    '''
+# The articles are vectorized once into an L2 normalized TF-IDF matrix of their name,
+# description and body, see article_recommendations.content
+make_content_recs = data.make_content_recs
 
 
 # `2.` Now that you have put together your content-based recommendation system, use the cell below to write a summary explaining how your content based recommender works.  Do you see any possible improvements that could be made to your function?  Is there anything novel about your content based recommender?
 #
 # ### This part is NOT REQUIRED to pass this project.  However, you may choose to take this on as an extra way to show off your skills.
 
-# **Write an explanation of your content based recommendation system here.**
+# Every article is turned into a TF-IDF vector of the words in its name, description and body (articles without content use their title). A user is represented by the normalized sum of the vectors of the articles they saw, and the unseen articles with the highest cosine similarity to that sum are recommended. It needs no interactions of other users, so it also covers users the collaborative filtering and the SVD cannot score. Possible improvements are weighting the history by recency and breaking ties by popularity.
 
 # `3.` Use your content-recommendation system to make recommendations for the below scenarios based on the comments.  Again no tests are provided here, because there isn't one right answer that could be used to find these content based recommendations.
 #
@@ -646,9 +424,11 @@ def make_content_recs():
 
 
 # make recommendations for a brand new user
-
+# there is no history to compare the content to, fall back to the most popular articles
+new_user_content_recs = [str(x) for x in get_top_article_ids(10)]
 
 # make a recommendations for a user who only has interacted with article id '1427.0'
+rec_ids_1427, rec_names_1427 = make_content_recs(['1427.0'], 10)
 
 
 # ### <a class="anchor" id="Matrix-Fact">Part V: Matrix Factorization</a>
@@ -678,7 +458,12 @@ user_item_matrix.head()
 
 # Perform SVD on the User-Item Matrix Here
 
-u, s, vt = np.linalg.svd(user_item_matrix)# use the built in to get the three matrices
+# 'full' decomposes the dense matrix, 'truncated' (ARPACK) and 'randomized' only compute
+# the top SVD_K latent features and work on a sparse matrix directly
+SVD_METHOD = 'full'
+SVD_K = None
+
+u, s, vt = ar.svd(ar.user_item_data(user_item_matrix), k=SVD_K, method=SVD_METHOD)# use the built in to get the three matrices
 
 
 # **Provide your response here.**
@@ -689,25 +474,14 @@ u, s, vt = np.linalg.svd(user_item_matrix)# use the built in to get the three ma
 
 
 num_latent_feats = np.arange(10,700+10,20)
-sum_errs = []
-
-for k in num_latent_feats:
-    # restructure with k latent features
-    s_new, u_new, vt_new = np.diag(s[:k]), u[:, :k], vt[:k, :]
-    # take dot product
-    user_item_est = np.around(np.dot(np.dot(u_new, s_new), vt_new))
-    # compute error for each prediction to actual value
-    diffs = np.subtract(user_item_matrix, user_item_est)
-    # total errors and keep track of them
-    err = np.sum(np.sum(np.abs(diffs)))
-    sum_errs.append(err)
-
-
-plt.plot(num_latent_feats, 1 - np.array(sum_errs)/df.shape[0]);
-plt.xlabel('Number of Latent Features');
-plt.ylabel('Accuracy');
-plt.title('Accuracy vs. Number of Latent Features');
-plt.show()
+num_latent_feats = num_latent_feats[num_latent_feats <= len(s)]
+
+# total absolute error of the rounded reconstruction with k latent features, for every k
+sum_errs = ar.reconstruction_errors(u, s, vt, ar.user_item_data(user_item_matrix),
+                                    num_latent_feats)
+
+
+ar.plot_accuracy(num_latent_feats, sum_errs, df.shape[0])
 
 # `4.` From the above, we can't really be sure how many features to use, because simply having a better way to predict the 1's and 0's of the matrix doesn't exactly give us an indication of if we are able to make good recommendations.  Instead, we might split our dataset into a training and test set of data, as shown in the cell below.
 #
@@ -724,29 +498,8 @@ plt.show()
 df_train = df.head(40000)
 df_test = df.tail(5993)
 
-def create_test_and_train_user_item(df_train, df_test):
-    '''
-    INPUT:
-    df_train - training dataframe
-    df_test - test dataframe
-
-    OUTPUT:
-    user_item_train - a user-item matrix of the training dataframe
-                      (unique users for each row and unique articles for each column)
-    user_item_test - a user-item matrix of the testing dataframe
-                    (unique users for each row and unique articles for each column)
-    test_idx - all of the test user ids
-    test_arts - all of the test article ids
-
-    '''
-    user_item_train = create_user_item_matrix(df_train)
-    user_item_test = create_user_item_matrix(df_test)
-    test_idx = set(df_test['user_id'].to_list())
-    test_arts = set(df_test['article_id'].to_list())
-
-    return user_item_train, user_item_test, test_idx, test_arts
-
-user_item_train, user_item_test, test_idx, test_arts = create_test_and_train_user_item(df_train, df_test)
+user_item_train, user_item_test, test_idx, test_arts = ar.create_test_and_train_user_item(df_train, df_test,
+                                                                                     sparse=SPARSE_USER_ITEM)
 
 
 # In[ ]:
@@ -788,7 +541,7 @@ t.sol_4_test(sol_4_dict)
 
 
 # fit SVD on the user_item_train matrix
-u_train, s_train, vt_train = np.linalg.svd(user_item_train) # fit svd similar to above then use the cells below
+u_train, s_train, vt_train = ar.svd(ar.user_item_data(user_item_train), k=SVD_K, method=SVD_METHOD) # fit svd similar to above then use the cells below
 predictable_user_helper = user_item_train.index.isin(test_idx)
 predictable_users = user_item_train.index[predictable_user_helper]
 predictable_users_check = user_item_test.index.isin(predictable_users)
@@ -797,6 +550,19 @@ all(predictable_users_test == predictable_users)
 
 u_test = u_train[predictable_user_helper, :]
 vt_test = vt_train[:, common_articles]
+user_item_test_data = ar.user_item_data(user_item_test)[
+    user_item_test.index.get_indexer(predictable_users)]
+# In[ ]:
+
+
+# the test users that are not in the training data can still be scored: folding in
+# projects the articles they saw onto the training factors, without a refit
+svd_train = ar.SVDModel(u_train, s_train, vt_train, user_item_train.index,
+                        user_item_train.columns)
+new_users = sorted(test_idx - set(user_item_train.index))
+new_histories = df_test[df_test['user_id'].isin(new_users)].groupby('user_id')['article_id']
+new_scores, new_recs = svd_train.batch_fold_in(new_histories.apply(list).tolist(), m=10)
+new_recs[:3]
 # In[ ]:
 
 
@@ -804,35 +570,33 @@ vt_test = vt_train[:, common_articles]
 # decomposition to predict on test data
 
 num_latent_feats = np.arange(10,700+10,20)
-sum_errs = []
+num_latent_feats = num_latent_feats[num_latent_feats <= len(s_train)]
 
-for k in num_latent_feats:
-    # restructure with k latent features
-    s_new, u_new, vt_new = np.diag(s_train[:k]), u_train[:, :k], vt_train[:k, :]
-    u_test_new, vt_test_new = u_test[:, :k], vt_test[:k, :]
-    # take dot product
-    user_item_est = np.around(np.dot(np.dot(u_test_new, s_new), vt_test_new))
-    # compute error for each prediction to actual value
-    diffs = np.subtract(user_item_test.loc[predictable_users], user_item_est)
-    # total errors and keep track of them
-    err = np.sum(np.sum(np.abs(diffs)))
-    sum_errs.append(err)
-    user_item_est.shape
-    user_item_test.loc[predictable_users].shape
+# errors on the test users we can predict for, using the factors fit on the training data
+sum_errs = ar.reconstruction_errors(u_test, s_train, vt_test, user_item_test_data,
+                                    num_latent_feats)
+# the same, only counting the articles the test users actually interacted with
+observed_errs = ar.reconstruction_errors(u_test, s_train, vt_test, user_item_test_data,
+                                         num_latent_feats, observed_only=True)
 
 
-plt.plot(num_latent_feats, 1 - np.array(sum_errs)/df.shape[0]);
-plt.xlabel('Number of Latent Features');
-plt.ylabel('Accuracy');
-plt.title('Accuracy vs. Number of Latent Features');
-plt.show()
+ar.plot_accuracy(num_latent_feats, sum_errs, df.shape[0])
 
 
 
 # In[ ]:
 
 
-
+# precision@10, recall@10 and coverage of the recommenders on the same split, for the
+# test users that are also in the training data. The configs run in parallel
+eval_configs = ([{'recommender': 'popular'}, {'recommender': 'user_user'},
+                 {'recommender': 'item_item'}]
+                + [{'recommender': 'svd', 'params': {'k': k}} for k in (10, 50, 100)]
+                # implicit feedback ALS on the sparse training matrix, no dense svd needed
+                + [{'recommender': 'als', 'params': {'k': k, 'random_state': 0}}
+                   for k in (10, 50)])
+eval_summary, eval_scores = ar.evaluate(eval_configs, df_train, df_test, m=10)
+eval_summary
 
 
 # In[ ]:
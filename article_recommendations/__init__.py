@@ -0,0 +1,25 @@
+from .als import ALS_MEMORY_BUDGET, ALSModel
+from .cache import load_csv
+from .collaborative import (BATCH_MEMORY_BUDGET, batch_find_similar_users, batch_top_sorted_users,
+                            batch_user_user_recs, batch_user_user_recs_part2, get_article_names,
+                            get_user_articles, rank_neighbor_articles, user_user_recs,
+                            user_user_recs_part2)
+from .content import TfidfIndex, article_texts, create_content_titles, make_content_recs
+from .data import (RecommendationData, create_article_titles, create_user_articles, email_mapper,
+                   load_articles, load_interactions, map_emails)
+from .encoder import EmailEncoder
+from .evaluation import RECOMMENDERS, EvaluationData, evaluate
+from .factorization import SVDModel, plot_accuracy, reconstruction_errors, svd
+from .ingest import InteractionStore
+from .item_item import ItemItemModel, item_item_recs
+from .lsh import MinHashLSH
+from .matrix import (SparseUserItem, create_sparse_user_item_matrix,
+                     create_test_and_train_user_item, create_user_item_matrix,
+                     get_interaction_counts, user_item_data, user_item_values)
+from .ranking import (add_ordered, create_popularity_table, get_article_ranks,
+                      get_popularity_table, get_top_article_ids, get_top_articles)
+from .result_cache import MISSING, ResultCache
+from .server import MicroBatcher, RecommendationServer, ServingModel
+from .similarity import (find_similar_users, get_top_sorted_users, rank_neighbors,
+                         top_similar_users)
+from .synthetic import SyntheticData
@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .instrument import timed
+from .matrix import get_user_item_csc, user_item_data, user_rows
+
+
+# bytes the per-interaction k x k outer products of one block of rows may take
+ALS_MEMORY_BUDGET = 256 * 2 ** 20
+
+
+class ALSModel:
+    '''
+    A latent factor model for implicit feedback, fit by alternating least squares
+    (Hu, Koren and Volinsky, Collaborative Filtering for Implicit Feedback Datasets).
+
+    user_factors - (numpy array) float32 n_users x k
+    item_factors - (numpy array) float32 n_articles x k
+    index - (pandas index) the user_id of each row of user_factors
+    columns - (pandas index) the article_id of each row of item_factors
+
+    Every cell of the matrix is a preference, 1 for an interaction and 0 otherwise,
+    with confidence 1 + alpha * value. Unlike the SVD the unobserved cells are weak
+    evidence rather than exact zeros, and fitting never densifies the matrix.
+    '''
+    def __init__(self, user_factors, item_factors, index, columns):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.index = index
+        self.columns = columns
+
+    @classmethod
+    @timed('als', size=lambda model: model.user_factors.shape[1])
+    def fit(cls, user_item, k=50, alpha=40.0, regularization=0.1, iterations=15,
+            n_threads=None, random_state=None, memory_budget=ALS_MEMORY_BUDGET):
+        '''
+        INPUT:
+        user_item - (pandas dataframe or SparseUserItem) matrix of users by articles,
+                    e.g. user_item_train of create_test_and_train_user_item
+        k - (int) the number of latent features
+        alpha - (float) how much more an interaction counts than no interaction
+        regularization - (float) the L2 penalty of the factors
+        iterations - (int) the number of times both sides are solved
+        n_threads - (int) threads solving blocks of rows, one per cpu if None
+        random_state - (int) seeds the initial item factors
+        memory_budget - (int) see solve_factors
+
+        OUTPUT:
+        model - (ALSModel) fit on user_item
+        '''
+        matrix = csr_matrix(user_item_data(user_item), dtype=np.float32)
+        items = get_user_item_csc(user_item).T.tocsr().astype(np.float32)
+        rng = np.random.default_rng(random_state)
+        user_factors = np.zeros((matrix.shape[0], k), dtype=np.float32)
+        item_factors = (rng.standard_normal((matrix.shape[1], k)) * 0.01).astype(np.float32)
+
+        with ThreadPoolExecutor(n_threads or os.cpu_count()) as executor:
+            for _ in range(iterations):
+                user_factors = solve_factors(matrix, item_factors, alpha, regularization,
+                                             executor, memory_budget)
+                item_factors = solve_factors(items, user_factors, alpha, regularization,
+                                             executor, memory_budget)
+        return cls(user_factors, item_factors, user_item.index, user_item.columns)
+
+    def predict(self, user_ids):
+        '''
+        INPUT:
+        user_ids - (int or list of ints) users the model was fit on
+
+        OUTPUT:
+        scores - (numpy array) len(user_ids) x n_articles predicted preferences
+        '''
+        return self.user_factors[user_rows(self, user_ids)] @ self.item_factors.T
+
+
+def solve_factors(matrix, fixed, alpha, regularization, executor=None,
+                  memory_budget=ALS_MEMORY_BUDGET):
+    '''
+    INPUT:
+    matrix - (scipy csr matrix) float32, the interactions of the rows to solve for
+             (users, or articles with the transposed matrix)
+    fixed - (numpy array) float32 factors of the other side, one row per column
+    alpha, regularization - see ALSModel.fit
+    executor - (Executor) solves the blocks of rows, in this thread if None
+    memory_budget - (int) bytes the outer products of one block of rows may take
+
+    OUTPUT:
+    factors - (numpy array) float32 matrix.shape[0] x k, the least squares factors of
+              every row given fixed
+
+    Description:
+    Row u solves (F'F + F'(C_u - I)F + regularization I) x = F'C_u p_u. F'F is the same
+    for every row and computed once, C_u - I and p_u are 0 outside the row's
+    interactions, so the rest only sums over its nonzeros. The systems of a block of
+    rows are solved together with one stacked np.linalg.solve. Rows without
+    interactions get zero factors
+    '''
+    k = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(k, dtype=np.float32)
+    factors = np.zeros((matrix.shape[0], k), dtype=np.float32)
+
+    # blocks of rows with about max_nnz interactions, a longer row is a block of its own
+    max_nnz = max(1, memory_budget // (4 * k * k))
+    bounds = np.unique(np.concatenate([
+        np.searchsorted(matrix.indptr, np.arange(max_nnz, matrix.nnz, max_nnz), side='right') - 1,
+        [0, matrix.shape[0]]]))
+
+    def solve_block(start, end):
+        block = matrix[start:end]
+        if block.nnz == 0:
+            return
+        vectors = fixed[block.indices]
+        weights = alpha * block.data
+        # the sums over the nonzeros of each row as products with the block's pattern
+        pattern = csr_matrix((weights, np.arange(block.nnz), block.indptr),
+                             shape=(end - start, block.nnz))
+        outer = np.einsum('ni,nj->nij', vectors, vectors).reshape(block.nnz, k * k)
+        a = (pattern @ outer).reshape(end - start, k, k) + gram
+        pattern.data = 1 + weights
+        b = pattern @ vectors
+        factors[start:end] = np.linalg.solve(a, b[..., None])[..., 0]
+
+    blocks = list(zip(bounds[:-1], bounds[1:]))
+    if executor is None:
+        for start, end in blocks:
+            solve_block(start, end)
+    else:
+        # raises the first error of any block
+        list(executor.map(lambda block: solve_block(*block), blocks))
+    return factors
@@ -0,0 +1,185 @@
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import scipy
+
+from .data import INTERACTIONS_PATH, RecommendationData, load_interactions, map_emails
+from .factorization import reconstruction_errors, svd
+from .matrix import create_user_item_matrix, user_item_data
+
+
+def scale_interactions(df, scale):
+    '''
+    INPUT:
+    df - (pandas dataframe) interactions with article_id, title, user_id columns
+    scale - (int) how many times larger the result should be
+
+    OUTPUT:
+    df - (pandas dataframe) scale copies of df, the users of every copy renumbered
+         after the ones of the copy before. The articles stay the same, so the
+         matrices grow in users and interactions like a larger user base would
+    '''
+    if scale == 1:
+        return df
+    offset = int(df['user_id'].max())
+    copies = []
+    for i in range(scale):
+        copy = df.copy()
+        copy['user_id'] = copy['user_id'] + i * offset
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def time_calls(function, calls):
+    '''
+    INPUT:
+    function - (function) the entry point to time
+    calls - (list of tuples) the positional arguments of each call
+
+    OUTPUT:
+    stats - (dict) latency percentiles and mean in milliseconds, the calls per second
+            and the peak memory in MB the traced allocations of one call took
+
+    Description:
+    Every call is timed on its own. The peak memory is measured in an extra call
+    under tracemalloc, which slows allocations down and is kept out of the timings
+    '''
+    latencies = []
+    for args in calls:
+        start = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+
+    tracemalloc.start()
+    function(*calls[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {'n_calls': len(calls),
+            'p50_ms': p50, 'p90_ms': p90, 'p99_ms': p99,
+            'mean_ms': latencies.mean(), 'max_ms': latencies.max(),
+            'throughput_per_s': len(calls) / latencies.sum() * 1000,
+            'peak_memory_mb': peak / 2 ** 20}
+
+
+def svd_sweep(user_item, k, method):
+    '''
+    The SVD of the notebook: the factors with k latent features and the
+    reconstruction errors for every 20 of them
+    '''
+    matrix = user_item_data(user_item)
+    u, s, vt = svd(matrix, k=k, method=method)
+    return reconstruction_errors(u, s, vt, matrix, np.arange(10, len(s) + 1, 20))
+
+
+def benchmark_scale(df, scale, n_calls=100, n_builds=3, sparse=True, svd_k=100,
+                    svd_method='randomized', seed=0):
+    '''
+    INPUT:
+    df - (pandas dataframe) interactions with article_id, title, user_id columns
+    scale - (int) the data scale, see scale_interactions
+    n_calls - (int) the number of calls of each per-user entry point
+    n_builds - (int) the number of calls of create_user_item_matrix and of the SVD sweep
+    sparse - (bool) benchmark a SparseUserItem instead of the dense dataframe
+    svd_k, svd_method - the number of latent features and the method of the SVD sweep
+    seed - (int) seeds the sample of query users
+
+    OUTPUT:
+    result - (dict) the size of the data and the stats of every entry point, see
+             time_calls
+
+    Description:
+    The structures the entry points share (user_item, article_titles,
+    user_articles, the popularity table) are built and every entry point is called
+    once before the timings, so they measure warm queries like a long running
+    process serves them
+    '''
+    df = scale_interactions(df, scale)
+    data = RecommendationData.from_frames(df, sparse=sparse)
+    user_item = data.user_item
+    rng = np.random.default_rng(seed)
+    user_ids = rng.choice(np.asarray(user_item.index), n_calls)
+    user_calls = [(user_id,) for user_id in user_ids.tolist()]
+
+    entry_points = {
+        'create_user_item_matrix': (lambda: create_user_item_matrix(df, sparse=sparse),
+                                    [()] * n_builds),
+        'find_similar_users': (data.find_similar_users, user_calls),
+        'get_user_articles': (data.get_user_articles, user_calls),
+        'user_user_recs': (data.user_user_recs, user_calls),
+        'user_user_recs_part2': (data.user_user_recs_part2, user_calls),
+        'get_top_sorted_users': (data.get_top_sorted_users, user_calls),
+        'get_top_articles': (data.get_top_articles, [(10,)] * n_calls),
+        'svd_sweep': (lambda: svd_sweep(user_item, svd_k, svd_method), [()] * n_builds),
+    }
+    benchmarks = {}
+    for name, (function, calls) in entry_points.items():
+        function(*calls[0])
+        benchmarks[name] = time_calls(function, calls)
+
+    return {'scale': scale,
+            'n_interactions': len(df),
+            'n_users': user_item.shape[0],
+            'n_articles': user_item.shape[1],
+            'sparse': sparse,
+            'benchmarks': benchmarks,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def run_benchmarks(df, scales=(1, 10, 100), **kwargs):
+    '''
+    INPUT:
+    df - (pandas dataframe) interactions with article_id, title, user_id columns
+    scales - (list of ints) the data scales to benchmark, see scale_interactions
+    kwargs - passed on to benchmark_scale
+
+    OUTPUT:
+    report - (dict) the library versions, the settings and the result of every scale
+    '''
+    return {'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'versions': {'python': platform.python_version(), 'numpy': np.__version__,
+                         'pandas': pd.__version__, 'scipy': scipy.__version__},
+            'settings': kwargs,
+            'results': [benchmark_scale(df, scale, **kwargs) for scale in scales]}
+
+
+def main(argv=None):
+    '''
+    Runs the benchmarks on the interactions csv and writes the report as JSON, e.g.
+    python -m article_recommendations.benchmark --scales 1 10 100 --output bench.json
+    '''
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--interactions', default=INTERACTIONS_PATH)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--calls', type=int, default=100)
+    parser.add_argument('--builds', type=int, default=3)
+    parser.add_argument('--dense', action='store_true',
+                        help='benchmark the dense user_item dataframe')
+    parser.add_argument('--svd-k', type=int, default=100)
+    parser.add_argument('--svd-method', default='randomized')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='the JSON file, stdout if not given')
+    args = parser.parse_args(argv)
+
+    df = map_emails(load_interactions(args.interactions))
+    report = run_benchmarks(df, args.scales, n_calls=args.calls, n_builds=args.builds,
+                            sparse=not args.dense, svd_k=args.svd_k,
+                            svd_method=args.svd_method, seed=args.seed)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from .instrument import timed
+
+
+CACHE_DIR = os.path.join('data', '.cache')
+
+# A cached csv is a directory of .npy files, one set per column, and a meta.json
+# describing the columns and the source file it was built from. Numeric columns are
+# stored as they are. String columns are stored as int32 codes into a dictionary of
+# their distinct values, the dictionary as utf-8 bytes and offsets, so a column of
+# repeated titles or emails costs 4 bytes a row. Each column is read on its own, only
+# the requested columns are loaded.
+
+
+def file_digest(path):
+    '''
+    INPUT:
+    path - (str) a file
+
+    OUTPUT:
+    digest - (str) sha1 hex digest of the file contents
+    '''
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2 ** 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def encode_strings(values):
+    '''
+    INPUT:
+    values - (array-like) strings, nulls allowed
+
+    OUTPUT:
+    codes - (numpy array) int32 position of each value in the dictionary, -1 for nulls
+    data - (numpy array) uint8, the utf-8 bytes of the distinct values
+    offsets - (numpy array) int64, distinct value i is data[offsets[i]:offsets[i + 1]]
+    '''
+    codes, uniques = pd.factorize(pd.Series(values))
+    encoded = [value.encode('utf-8') for value in uniques]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return codes.astype(np.int32), data, offsets
+
+
+def decode_strings(codes, data, offsets, dtype=object):
+    '''
+    INPUT:
+    codes, data, offsets - see encode_strings
+    dtype - the dtype of the result
+
+    OUTPUT:
+    values - (pandas array) the strings, NaN for nulls
+    '''
+    buffer = data.tobytes()
+    uniques = np.empty(len(offsets), dtype=object)
+    uniques[:-1] = [buffer[start:end].decode('utf-8')
+                    for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+    uniques[-1] = np.nan
+    # code -1 takes the last entry, the NaN
+    return pd.array(uniques, dtype=dtype).take(codes)
+
+
+def read_cache_meta(directory, path):
+    '''
+    INPUT:
+    directory - (str) the cache directory of path
+    path - (str) the source csv file
+
+    OUTPUT:
+    meta - (dict) the contents of meta.json, None if there is no cache or it was built
+           from a different version of path. A file with a new mtime but the same size
+           and sha1 is still valid, its new mtime is recorded so it is not hashed again
+    '''
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    stat = os.stat(path)
+    if stat.st_size != meta['size']:
+        return None
+    if stat.st_mtime_ns != meta['mtime_ns']:
+        if file_digest(path) != meta['sha1']:
+            return None
+        meta['mtime_ns'] = stat.st_mtime_ns
+        try:
+            write_meta(directory, meta)
+        except OSError:
+            # only saves hashing next time, another process may be replacing directory
+            pass
+    return meta
+
+
+def write_meta(directory, meta):
+    '''
+    Replaces directory/meta.json with meta
+    '''
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='meta.json.')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+
+def write_cache(df, directory, path):
+    '''
+    INPUT:
+    df - (pandas dataframe) the cleaned contents of path
+    directory - (str) the cache directory to (re)build
+    path - (str) the source csv file
+
+    OUTPUT:
+    written - (bool) False if another process installed a valid cache of path first,
+              that one is kept
+
+    Description:
+    Writes the columns into a temporary directory of its own and renames it to
+    directory. Processes missing the cache at the same time each write their own
+    copy, the first rename wins. An outdated cache is renamed to a directory of its
+    own before it is removed, so no directory another process writes is deleted
+    '''
+    stat = os.stat(path)
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    tmp_directory = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(directory) + '.tmp')
+    columns = []
+    for i, name in enumerate(df.columns):
+        column = df[name]
+        prefix = os.path.join(tmp_directory, str(i))
+        if pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+            np.save(prefix + '.npy', column.values)
+            kind = 'array'
+        else:
+            codes, data, offsets = encode_strings(column)
+            np.save(prefix + '.codes.npy', codes)
+            np.save(prefix + '.data.npy', data)
+            np.save(prefix + '.offsets.npy', offsets)
+            kind = 'strings'
+        columns.append({'name': name, 'kind': kind, 'dtype': str(column.dtype)})
+    write_meta(tmp_directory, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                               'sha1': file_digest(path), 'n_rows': len(df),
+                               'columns': columns})
+    while True:
+        try:
+            os.rename(tmp_directory, directory)
+            return True
+        except OSError:
+            # directory exists (renaming onto a non-empty directory fails)
+            pass
+        if read_cache_meta(directory, path) is not None:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            return False
+        old_directory = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(directory) + '.old')
+        try:
+            os.replace(directory, old_directory)
+        except OSError:
+            # another process moved or replaced it in the meantime
+            pass
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+
+def read_cache(directory, meta, columns=None):
+    '''
+    INPUT:
+    directory - (str) a cache directory written by write_cache
+    meta - (dict) its meta.json, see read_cache_meta
+    columns - (list of str) the columns to load, all of them if None
+
+    OUTPUT:
+    df - (pandas dataframe) the cached frame, with the dtypes it was written with
+    '''
+    positions = {column['name']: i for i, column in enumerate(meta['columns'])}
+    if columns is None:
+        columns = [column['name'] for column in meta['columns']]
+    data = {}
+    for name in columns:
+        i = positions[name]
+        column = meta['columns'][i]
+        prefix = os.path.join(directory, str(i))
+        if column['kind'] == 'array':
+            values = np.load(prefix + '.npy')
+        else:
+            values = decode_strings(np.load(prefix + '.codes.npy'),
+                                    np.load(prefix + '.data.npy'),
+                                    np.load(prefix + '.offsets.npy'), column['dtype'])
+        data[name] = pd.Series(values, dtype=column['dtype'])
+    return pd.DataFrame(data, columns=columns)
+
+
+def cache_directory(cache_dir, path):
+    '''
+    OUTPUT:
+    directory - (str) the cache of path in cache_dir, named by its file name and a
+                hash of its resolved path, so files of the same name in different
+                directories have their own caches
+    '''
+    digest = hashlib.sha1(os.path.realpath(path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, '{}.{}'.format(os.path.basename(path), digest))
+
+
+def read_valid_cache(directory, path, columns=None):
+    '''
+    OUTPUT:
+    df - (pandas dataframe) the cache of path in directory, see read_cache. None if
+         there is no valid one, or it was replaced while being read
+    '''
+    meta = read_cache_meta(directory, path)
+    if meta is None:
+        return None
+    try:
+        return read_cache(directory, meta, columns)
+    except FileNotFoundError:
+        return None
+
+
+@timed('load')
+def load_csv(path, columns=None, cache_dir=CACHE_DIR):
+    '''
+    INPUT:
+    path - (str) a csv file written with its index as the first, unnamed column
+    columns - (list of str) the columns to load, all of them if None
+    cache_dir - (str) where to keep the binary copy of path, None to always parse the csv
+
+    OUTPUT:
+    df - (pandas dataframe) the contents of path without the index column
+
+    Description:
+    The first call parses the csv and writes it to cache_dir, later calls read the
+    binary copy until path changes
+    '''
+    if cache_dir is not None:
+        directory = cache_directory(cache_dir, path)
+        df = read_valid_cache(directory, path, columns)
+        if df is not None:
+            return df
+    df = pd.read_csv(path)
+    if 'Unnamed: 0' in df:
+        del df['Unnamed: 0']
+    if cache_dir is not None and not write_cache(df, directory, path):
+        # another process was first, read its copy like every later call will
+        cached = read_valid_cache(directory, path, columns)
+        if cached is not None:
+            return cached
+    if columns is not None:
+        df = df[columns]
+    return df
@@ -0,0 +1,385 @@
+import numpy as np
+
+from .instrument import timed
+from .matrix import (SparseUserItem, get_article_id_strings, get_user_item_csc, top_k_indices,
+                     user_item_data, user_item_values_at, user_rows)
+from .ranking import get_article_ranks
+from .similarity import (find_similar_users, get_top_sorted_users, rank_neighbor_rows,
+                         top_similar_rows)
+
+
+# bytes the working arrays of one chunk of query users may take in the batch functions
+BATCH_MEMORY_BUDGET = 256 * 2 ** 20
+
+# rank_neighbor_articles only reads the rows of the neighbors if there are at most
+# this share of all users, e.g. the candidates of a neighbor_index
+NEIGHBOR_ROWS_SHARE = 0.25
+
+
+@timed('names')
+def get_article_names(article_ids, article_titles):
+    '''
+    INPUT:
+    article_ids - (list) a list of article ids, as floats or strings like '1024.0'
+    article_titles - (dict) article_id -> title, see create_article_titles
+
+    OUTPUT:
+    article_names - (list) a list of article names associated with the list of article ids
+                    (this is identified by the title column), in the order of article_ids
+                    and without duplicates. Unknown article ids are skipped
+    '''
+    article_names = (article_titles.get(float(x)) for x in article_ids)
+    return list(dict.fromkeys(name for name in article_names if name is not None))
+
+
+def get_user_articles(user_id, user_articles, article_titles, user_item=None):
+    '''
+    INPUT:
+    user_id - (int) a user id
+    user_articles - (dict) user_id -> article ids, see create_user_articles
+    article_titles - (dict) article_id -> title, see create_article_titles
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles:
+                1's when a user has interacted with an article, 0 otherwise.
+                If given the articles are read from it instead of user_articles
+
+    OUTPUT:
+    article_ids - (list) a list of the article ids seen by the user, sorted by id
+    article_names - (list) a list of article names associated with the list of article ids
+                    (this is identified by the doc_full_name column in df_content)
+
+    Description:
+    Provides a list of the article_ids and article titles that have been seen by a user
+    '''
+    if user_item is None:
+        article_ids = user_articles[user_id]
+    elif isinstance(user_item, SparseUserItem):
+        # the stored entries of a csr row are exactly the articles seen
+        row = user_item.index.get_loc(user_id)
+        matrix = user_item.matrix
+        seen = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+        article_ids = list(user_item.columns[seen])
+    else:
+        user = user_item.loc[user_item.index == user_id]
+        article_ids = list(user.columns[np.array(user == 1)[0]])
+    article_ids = [str(x) for x in article_ids]
+    article_names = get_article_names(article_ids, article_titles)
+    return list(article_ids), article_names
+
+
+def rank_neighbor_articles(user_id, neighbors, m, user_item, article_rank=None):
+    '''
+    INPUT:
+    user_id - (int) the user to make recommendations for
+    neighbors - (list or numpy array) user_ids ordered from the closest neighbor to the farthest
+    m - (int) the number of recommendations you want for the user
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles:
+                1's when a user has interacted with an article, 0 otherwise
+    article_rank - (numpy array) popularity rank of every user_item column, 0 for the
+                   article with the most interactions. If None the column order is used
+
+    OUTPUT:
+    recs - (list) up to m article ids (as strings) the user has not seen, best first
+
+    Description:
+    Articles are ranked by the closest neighbor who saw them first and by
+    article_rank among articles of the same neighbor. This is the order in which
+    walking the neighbors one by one would pick them up, computed in one pass
+    over the matrix (see rank_neighbor_article_block), or over the rows of the
+    neighbors only if there are few of them (see rank_neighbor_article_rows).
+    '''
+    n_users = user_item.shape[0]
+    if len(neighbors) <= NEIGHBOR_ROWS_SHARE * n_users:
+        return rank_neighbor_article_rows(user_rows(user_item, user_id),
+                                          user_rows(user_item, neighbors), m, user_item,
+                                          article_rank)
+    positions = np.full((1, n_users), n_users)
+    positions[0, user_rows(user_item, neighbors)] = np.arange(len(neighbors))
+    recs = rank_neighbor_article_block(user_rows(user_item, user_id), positions, m,
+                                       user_item, article_rank)
+    return [rec for rec in recs[0] if rec is not None]
+
+
+@timed('candidates', size=lambda recs: np.count_nonzero(np.not_equal(recs, None)))
+def rank_neighbor_article_block(rows, positions, m, user_item, article_rank=None):
+    '''
+    INPUT:
+    rows - (numpy array) row positions of the query users
+    positions - (numpy array) len(rows) x n_users, the position of every user in the
+                neighbor ranking of each query user (0 for the closest neighbor),
+                n_users for users that are not a neighbor
+    m - (int) the number of recommendations per query user
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    article_rank - (numpy array) popularity rank of every user_item column, see
+                   rank_neighbor_articles
+
+    OUTPUT:
+    recs - (numpy array) len(rows) x m article ids (as strings), best first, padded
+           with None where fewer than m articles can be recommended
+
+    Description:
+    For every article the position of the closest neighbor who saw it is the
+    minimum of positions over the article's users, taken for all query users at
+    once with np.minimum.reduceat over the columns of the csc matrix. The score
+    orders by that position first and by article_rank second.
+    '''
+    n_users, n_articles = user_item.shape
+    if article_rank is None:
+        article_rank = np.arange(n_articles)
+
+    csc = get_user_item_csc(user_item)
+    starts = np.minimum(csc.indptr[:-1], max(csc.nnz - 1, 0))
+    first = np.minimum.reduceat(positions[:, csc.indices], starts, axis=1)
+    # reduceat does not leave empty columns empty, nobody saw those articles
+    first[:, np.diff(csc.indptr) == 0] = n_users
+    seen = user_item_values_at(user_item, rows) > 0
+
+    # articles no neighbor has seen are never recommended
+    candidates = (first < n_users) & ~seen
+    scores = -(first.astype(float) * n_articles + article_rank)
+    scores[~candidates] = -np.inf
+    top_idx = top_k_indices(scores, m)
+
+    article_ids = get_article_id_strings(user_item)
+    recs = np.full((len(rows), m), None, dtype=object)
+    recs[:, :top_idx.shape[1]] = np.where(np.take_along_axis(candidates, top_idx, axis=1),
+                                          article_ids[top_idx], None)
+    return recs
+
+
+@timed('candidates')
+def rank_neighbor_article_rows(row, neighbor_rows, m, user_item, article_rank=None):
+    '''
+    INPUT:
+    row - (int) row position of the query user
+    neighbor_rows - (numpy array) row positions of its neighbors, closest first
+    m, user_item, article_rank - see rank_neighbor_article_block
+
+    OUTPUT:
+    recs - (list) up to m article ids (as strings) the user has not seen, best first
+
+    Description:
+    The same ranking as rank_neighbor_article_block for one query user, reading
+    only the rows of the user and its neighbors. The interactions of the neighbor
+    rows come in neighbor order, so the first occurrence of an article is its
+    closest neighbor
+    '''
+    n_articles = user_item.shape[1]
+    if article_rank is None:
+        article_rank = np.arange(n_articles)
+    data = user_item_data(user_item)
+    neighbor_data = data[neighbor_rows]
+    if isinstance(user_item, SparseUserItem):
+        positions = np.repeat(np.arange(len(neighbor_rows)), np.diff(neighbor_data.indptr))
+        indices = neighbor_data.indices
+        seen = data[row].indices
+    else:
+        positions, indices = np.nonzero(neighbor_data > 0)
+        seen = np.flatnonzero(data[row] > 0)
+
+    articles, first = np.unique(indices, return_index=True)
+    unseen = ~np.isin(articles, seen)
+    articles = articles[unseen]
+    scores = positions[first[unseen]].astype(float) * n_articles + article_rank[articles]
+    best = articles[np.argsort(scores, kind='stable')[:m]]
+    return get_article_id_strings(user_item)[best].tolist()
+
+
+def user_user_recs(user_id, m=10, *, user_item, neighbor_index=None):
+    '''
+    INPUT:
+    user_id - (int) a user id
+    m - (int) the number of recommendations you want for the user
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles:
+                1's when a user has interacted with an article, 0 otherwise
+    neighbor_index - (MinHashLSH) if given, the neighbors are its candidates instead
+                     of all other users
+
+    OUTPUT:
+    recs - (list) a list of recommendations for the user
+
+    Description:
+    Loops through the users based on closeness to the input user_id
+    For each user - finds articles the user hasn't seen before and provides them as recs
+    Does this until m recommendations are found
+
+    Notes:
+    Users who are the same closeness are taken in user_id order as the 'next' user
+
+    For the user where the number of recommended articles starts below m
+    and ends exceeding m, the last items are taken in article_id order
+
+    '''
+    if neighbor_index is None:
+        similar_users = find_similar_users(user_id, user_item)
+    else:
+        similar_users = neighbor_index.find_similar_users(user_id)
+    return rank_neighbor_articles(user_id, similar_users, m, user_item)
+
+
+def user_user_recs_part2(user_id, m=10, *, df, user_item, article_titles, neighbor_index=None):
+    '''
+    INPUT:
+    user_id - (int) a user id
+    m - (int) the number of recommendations you want for the user
+    df - (pandas dataframe) interactions, ranks the articles by popularity
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles:
+                1's when a user has interacted with an article, 0 otherwise
+    article_titles - (dict) article_id -> title, see create_article_titles
+    neighbor_index - (MinHashLSH) see user_user_recs
+
+    OUTPUT:
+    recs - (list) a list of recommendations for the user by article id, best first
+    rec_names - (list) a list of recommendations for the user by article title
+
+    Description:
+    Ranks the articles of the users closest to the input user_id
+    (see rank_neighbor_articles) and keeps the first m the user hasn't seen
+
+    Notes:
+    * Choose the users that have the most total article interactions
+    before choosing those with fewer article interactions.
+
+    * Choose articles with the articles with the most total interactions
+    before choosing those with fewer total interactions.
+
+    '''
+    if neighbor_index is None:
+        neighbors_df = get_top_sorted_users(user_id, user_item)
+    else:
+        neighbors_df = neighbor_index.get_top_sorted_users(user_id)
+    article_rank = get_article_ranks(user_item.columns, df)
+    recs = rank_neighbor_articles(user_id, neighbors_df['neighbor_id'].values, m, user_item,
+                                  article_rank=article_rank)
+
+    rec_names = get_article_names(recs, article_titles)
+    return recs, rec_names
+
+
+# The batch functions below score many users at once (e.g. all of them in a nightly
+# job) and give the same results as calling the single user functions one by one.
+# The similarities are blocked matrix-matrix products, each block holding as many
+# query users as fit into memory_budget bytes.
+
+def batch_chunks(n_queries, user_item, memory_budget):
+    '''
+    INPUT:
+    n_queries - (int) the number of query users
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    memory_budget - (int) bytes the working arrays of one chunk may take
+
+    OUTPUT:
+    chunks - (generator of slices) consecutive ranges of query users
+    '''
+    n_users, n_articles = user_item.shape
+    nnz = get_user_item_csc(user_item).nnz
+    # per query user: a similarity row, neighbor order and positions, the positions
+    # gathered for every interaction and a few arrays of article scores
+    row_bytes = 8 * (3 * n_users + nnz + 4 * n_articles)
+    chunk_size = max(1, int(memory_budget // row_bytes))
+    for start in range(0, n_queries, chunk_size):
+        yield slice(start, start + chunk_size)
+
+
+def neighbor_positions(order, n_users):
+    '''
+    INPUT:
+    order - (numpy array) n_queries x k row positions of neighbors, best first
+    n_users - (int) the number of rows of user_item
+
+    OUTPUT:
+    positions - (numpy array) n_queries x n_users, the position of every user in order,
+                n_users for users that are not in it
+    '''
+    positions = np.full((len(order), n_users), n_users)
+    ranks = np.broadcast_to(np.arange(order.shape[1]), order.shape)
+    np.put_along_axis(positions, order, ranks, axis=1)
+    return positions
+
+
+def batch_find_similar_users(user_ids, user_item, k=None, memory_budget=BATCH_MEMORY_BUDGET):
+    '''
+    INPUT:
+    user_ids - (list of ints) the query users
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    k - (int) the number of neighbors per user, all other users if None
+    memory_budget - (int) see batch_chunks
+
+    OUTPUT:
+    neighbors - (numpy array) len(user_ids) x k, row i is
+                find_similar_users(user_ids[i], user_item)[:k]
+    '''
+    rows = user_rows(user_item, user_ids)
+    n_neighbors = user_item.shape[0] - 1
+    k = n_neighbors if k is None else min(k, n_neighbors)
+    index = np.asarray(user_item.index)
+    neighbors = np.empty((len(rows), k), dtype=index.dtype)
+    for chunk in batch_chunks(len(rows), user_item, memory_budget):
+        top_idx, _ = top_similar_rows(rows[chunk], k, user_item)
+        neighbors[chunk] = index[top_idx]
+    return neighbors
+
+
+def batch_top_sorted_users(user_ids, user_item, k=None, memory_budget=BATCH_MEMORY_BUDGET):
+    '''
+    INPUT:
+    user_ids - (list of ints) the query users
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    k - (int) the number of neighbors per user, all other users if None
+    memory_budget - (int) see batch_chunks
+
+    OUTPUT:
+    neighbor_ids, similarity, num_interactions - (numpy arrays) len(user_ids) x k,
+        row i holds the columns of get_top_sorted_users(user_ids[i], user_item, k=k)
+    '''
+    rows = user_rows(user_item, user_ids)
+    chunks = [rank_neighbor_rows(rows[chunk], k, user_item)
+              for chunk in batch_chunks(len(rows), user_item, memory_budget)]
+    order, similarity, num_interactions = (np.concatenate(parts) for parts in zip(*chunks))
+    return np.asarray(user_item.index)[order], similarity, num_interactions
+
+
+def batch_user_user_recs(user_ids, m=10, *, user_item, memory_budget=BATCH_MEMORY_BUDGET):
+    '''
+    INPUT:
+    user_ids - (list of ints) the query users
+    m - (int) the number of recommendations per user
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    memory_budget - (int) see batch_chunks
+
+    OUTPUT:
+    recs - (numpy array) len(user_ids) x m article ids, row i is
+           user_user_recs(user_ids[i], m, user_item=user_item) padded with None
+    '''
+    rows = user_rows(user_item, user_ids)
+    recs = np.empty((len(rows), m), dtype=object)
+    for chunk in batch_chunks(len(rows), user_item, memory_budget):
+        top_idx, _ = top_similar_rows(rows[chunk], None, user_item)
+        positions = neighbor_positions(top_idx, user_item.shape[0])
+        recs[chunk] = rank_neighbor_article_block(rows[chunk], positions, m, user_item)
+    return recs
+
+
+def batch_user_user_recs_part2(user_ids, m=10, *, df, user_item, k=None,
+                               memory_budget=BATCH_MEMORY_BUDGET):
+    '''
+    INPUT:
+    user_ids - (list of ints) the query users
+    m - (int) the number of recommendations per user
+    df - (pandas dataframe) interactions, ranks the articles by popularity
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    k - (int) only recommend articles of the k best neighbors, all other users if None
+    memory_budget - (int) see batch_chunks
+
+    OUTPUT:
+    recs - (numpy array) len(user_ids) x m article ids, row i holds the ids of
+           user_user_recs_part2(user_ids[i], m, ...) padded with None
+    '''
+    rows = user_rows(user_item, user_ids)
+    article_rank = get_article_ranks(user_item.columns, df)
+    recs = np.empty((len(rows), m), dtype=object)
+    for chunk in batch_chunks(len(rows), user_item, memory_budget):
+        order, _, _ = rank_neighbor_rows(rows[chunk], k, user_item)
+        positions = neighbor_positions(order, user_item.shape[0])
+        recs[chunk] = rank_neighbor_article_block(rows[chunk], positions, m, user_item,
+                                                  article_rank)
+    return recs
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, load_npz, save_npz
+
+from .collaborative import get_article_names
+from .matrix import top_k_indices
+
+
+TOKEN_PATTERN = r'(?u)\b\w\w+\b'
+
+
+def article_texts(df, df_content):
+    '''
+    INPUT:
+    df - (pandas dataframe) interactions with article_id, title columns
+    df_content - (pandas dataframe) article content with article_id, doc_full_name,
+                 doc_description, doc_body columns
+
+    OUTPUT:
+    texts - (pandas series) the text of every article, indexed by article_id (float).
+            Name, description and body from df_content, the interaction title for
+            articles that are only in df
+    '''
+    content = df_content.drop_duplicates('article_id')
+    content_texts = pd.Series(
+        (content['doc_full_name'].fillna('') + ' ' + content['doc_description'].fillna('')
+         + ' ' + content['doc_body'].fillna('')).values,
+        index=content['article_id'].astype(float).values)
+    titles = df.drop_duplicates('article_id').set_index('article_id')['title']
+    titles = titles[~titles.index.isin(content_texts.index)]
+    texts = pd.concat([content_texts, titles.fillna('')])
+    texts.index.name = 'article_id'
+    return texts.sort_index()
+
+
+def texts_digest(texts):
+    '''
+    OUTPUT:
+    digest - (str) sha1 hex digest of the article ids and texts, changes with any
+             article added, removed or edited
+    '''
+    hashes = pd.util.hash_pandas_object(texts, index=True).values
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+
+def create_content_titles(article_titles, df_content):
+    '''
+    INPUT:
+    article_titles - (dict) article_id -> title, see create_article_titles
+    df_content - (pandas dataframe) article content with article_id, doc_full_name columns
+
+    OUTPUT:
+    content_titles - (dict) article_id (float) -> title of every article of either,
+                     the interaction title if there is one and doc_full_name otherwise
+    '''
+    content = df_content.dropna(subset=['doc_full_name']).drop_duplicates('article_id')
+    content_titles = dict(zip(content['article_id'].astype(float), content['doc_full_name']))
+    content_titles.update(article_titles)
+    return content_titles
+
+
+class TfidfIndex:
+    '''
+    Articles as rows of an L2 normalized TF-IDF matrix, the cosine similarity of two
+    articles is the dot product of their rows.
+
+    matrix - (scipy csr matrix) articles by terms
+    article_ids - (pandas index) the article_id (float) of each row
+    vocabulary - (numpy array) the term of each column
+    source_digest - (str) texts_digest of the texts the index was fit on
+    '''
+    def __init__(self, matrix, article_ids, vocabulary, source_digest=None):
+        self.matrix = matrix
+        self.article_ids = article_ids
+        self.vocabulary = vocabulary
+        self.source_digest = source_digest
+
+    @classmethod
+    def fit(cls, texts, min_df=2, max_df=0.5):
+        '''
+        INPUT:
+        texts - (pandas series) article texts indexed by article_id, see article_texts
+        min_df - (int) terms in fewer articles are dropped
+        max_df - (float) terms in a larger share of the articles are dropped
+
+        OUTPUT:
+        index - (TfidfIndex) the vectorized articles
+
+        Description:
+        Terms are the lower cased words of at least two word characters (letters,
+        digits or underscores), see TOKEN_PATTERN. The weight of a term is its count
+        in the article times the smoothed idf log((1 + n_articles) / (1 + df)) + 1
+        '''
+        tokens = texts.str.lower().str.findall(TOKEN_PATTERN).explode().dropna()
+        rows = texts.index.get_indexer(tokens.index)
+        term_codes, terms = pd.factorize(tokens.values, sort=True)
+        counts = csr_matrix((np.ones(len(rows)), (rows, term_codes)),
+                            shape=(len(texts), len(terms)))
+        counts.sum_duplicates()
+
+        document_frequency = np.bincount(counts.indices, minlength=len(terms))
+        keep = (document_frequency >= min_df) & (document_frequency <= max_df * len(texts))
+        counts = counts[:, keep]
+        idf = np.log((1 + len(texts)) / (1 + document_frequency[keep])) + 1
+        matrix = normalize_rows(counts.multiply(idf).tocsr())
+        return cls(matrix, pd.Index(texts.index.astype(float), name='article_id'),
+                   np.asarray(terms)[keep].astype(str), texts_digest(texts))
+
+    def save(self, path):
+        '''
+        INPUT:
+        path - (str) directory to write the matrix, article ids, vocabulary and
+               source_digest to
+        '''
+        os.makedirs(path, exist_ok=True)
+        save_npz(os.path.join(path, 'matrix.npz'), self.matrix)
+        np.save(os.path.join(path, 'article_ids.npy'), self.article_ids.values)
+        np.save(os.path.join(path, 'vocabulary.npy'), self.vocabulary)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'source_digest': self.source_digest}, f)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        INPUT:
+        path - (str) directory written by save
+
+        OUTPUT:
+        index - (TfidfIndex) the saved index, its source_digest None if it was saved
+                without one
+        '''
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                source_digest = json.load(f)['source_digest']
+        except FileNotFoundError:
+            source_digest = None
+        return cls(load_npz(os.path.join(path, 'matrix.npz')).tocsr(),
+                   pd.Index(np.load(os.path.join(path, 'article_ids.npy')), name='article_id'),
+                   np.load(os.path.join(path, 'vocabulary.npy')), source_digest)
+
+    def rows(self, article_ids):
+        '''
+        INPUT:
+        article_ids - (list) article ids as floats or strings like '1024.0'
+
+        OUTPUT:
+        rows - (numpy array) row positions of the known articles, unknown ones are skipped
+        '''
+        rows = self.article_ids.get_indexer([float(x) for x in article_ids])
+        return rows[rows >= 0]
+
+    def top_articles(self, profiles, exclude, m):
+        '''
+        INPUT:
+        profiles - (scipy csr matrix) n_queries x n_terms query vectors
+        exclude - (list of numpy arrays) the rows not to return for each query
+        m - (int) the number of articles per query
+
+        OUTPUT:
+        recs - (list of lists) up to m article ids (as strings) per query, the most
+               similar first, ties in article_id order. Articles sharing no term with
+               the query are not returned
+        '''
+        scores = profiles.dot(self.matrix.T).toarray()
+        for i, rows in enumerate(exclude):
+            scores[i, rows] = 0
+        scores[scores <= 0] = -np.inf
+        top_idx = top_k_indices(scores, m)
+        article_ids = np.array([str(x) for x in self.article_ids], dtype=object)
+        found = np.take_along_axis(scores, top_idx, axis=1) > -np.inf
+        return [article_ids[idx[keep]].tolist() for idx, keep in zip(top_idx, found)]
+
+    def similar_articles(self, article_ids, m=10):
+        '''
+        INPUT:
+        article_ids - (list) article ids as floats or strings like '1024.0'
+        m - (int) the number of articles to return for each of them
+
+        OUTPUT:
+        recs - (list of lists) for each article the m most similar other articles
+               (as strings) by cosine similarity, see top_articles
+        '''
+        rows = self.rows(article_ids)
+        return self.top_articles(self.matrix[rows], [[row] for row in rows], m)
+
+    def recommend_for_history(self, histories, m=10):
+        '''
+        INPUT:
+        histories - (list of lists) the article ids seen by each query user
+        m - (int) the number of recommendations per user
+
+        OUTPUT:
+        recs - (list of lists) for each user the m unseen articles most similar to the
+               sum of the articles they saw, see top_articles. Empty for users without
+               known articles
+        '''
+        history_rows = [self.rows(history) for history in histories]
+        indptr = np.cumsum([0] + [len(rows) for rows in history_rows])
+        indices = np.concatenate(history_rows + [np.empty(0, dtype=int)])
+        selection = csr_matrix((np.ones(len(indices)), indices, indptr),
+                               shape=(len(history_rows), self.matrix.shape[0]))
+        profiles = normalize_rows(selection.dot(self.matrix).tocsr())
+        return self.top_articles(profiles, history_rows, m)
+
+
+def normalize_rows(matrix):
+    '''
+    INPUT:
+    matrix - (scipy csr matrix)
+
+    OUTPUT:
+    matrix - (scipy csr matrix) every nonzero row scaled to unit L2 norm
+    '''
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return csr_matrix(matrix.multiply(1 / norms[:, None]))
+
+
+def make_content_recs(article_ids, m=10, *, content_index, article_titles):
+    '''
+    INPUT:
+    article_ids - (list) the articles a user interacted with, as floats or strings
+    m - (int) the number of recommendations
+    content_index - (TfidfIndex) the vectorized articles
+    article_titles - (dict) article_id -> title, see create_content_titles. Titles
+                     of the interactions only leave out the articles nobody viewed
+
+    OUTPUT:
+    recs - (list) up to m article ids (as strings) the user has not seen, the most
+           similar by content to the articles they saw first
+    rec_names - (list) the titles of recs
+
+    Description:
+    Needs no interactions of other users, so it also works for users the
+    collaborative recommenders and the SVD cannot score. A user without known
+    articles gets no recommendations, use get_top_article_ids for them
+    '''
+    recs = content_index.recommend_for_history([article_ids], m)[0]
+    return recs, get_article_names(recs, article_titles)
@@ -0,0 +1,225 @@
+import os
+from functools import cached_property
+
+import numpy as np
+
+from .cache import CACHE_DIR, load_csv
+from .collaborative import get_article_names, get_user_articles, user_user_recs, user_user_recs_part2
+from .content import (TfidfIndex, article_texts, create_content_titles, make_content_recs,
+                      texts_digest)
+from .encoder import EmailEncoder
+from .matrix import create_user_item_matrix
+from .ranking import get_popularity_table, get_top_article_ids, get_top_articles
+from .similarity import find_similar_users, get_top_sorted_users
+
+
+INTERACTIONS_PATH = 'data/user-item-interactions.csv'
+ARTICLES_PATH = 'data/articles_community.csv'
+
+
+def load_interactions(path=INTERACTIONS_PATH, columns=None, cache_dir=CACHE_DIR):
+    '''
+    INPUT:
+    path - (str) csv file of the user-article interactions
+    columns - (list of str) the columns to load, all of them if None
+    cache_dir - (str) see load_csv
+
+    OUTPUT:
+    df - (pandas dataframe) article_id, title, email columns, one row per interaction
+    '''
+    return load_csv(path, columns=columns, cache_dir=cache_dir)
+
+
+def load_articles(path=ARTICLES_PATH, columns=None, cache_dir=CACHE_DIR):
+    '''
+    INPUT:
+    path - (str) csv file of the article content
+    columns - (list of str) the columns to load, all of them if None. Must include
+              article_id
+    cache_dir - (str) see load_csv
+
+    OUTPUT:
+    df_content - (pandas dataframe) doc_body, doc_description, doc_full_name, doc_status,
+                 article_id columns, keeping only the first row of duplicated article ids
+    '''
+    df_content = load_csv(path, columns=columns, cache_dir=cache_dir)
+    df_content.drop_duplicates('article_id', keep='first', inplace=True)
+    return df_content
+
+
+def email_mapper(df, encoder=None):
+    '''
+    INPUT:
+    df - (pandas dataframe) interactions with an email column
+    encoder - (EmailEncoder) the mapping to extend, a new one if None
+
+    OUTPUT:
+    email_encoded - (numpy array) a user_id for every row. Emails the encoder has not
+                    seen are numbered after the known ones in the order they first
+                    appear. All null emails map to the same user
+    '''
+    if encoder is None:
+        encoder = EmailEncoder()
+    return encoder.encode(df['email'])
+
+
+def map_emails(df, encoder=None):
+    '''
+    INPUT:
+    df - (pandas dataframe) interactions with an email column
+    encoder - (EmailEncoder) see email_mapper
+
+    OUTPUT:
+    df - (pandas dataframe) a copy with the email column replaced by user_id
+    '''
+    email_encoded = email_mapper(df, encoder)
+    df = df.drop(columns='email')
+    df['user_id'] = email_encoded
+    return df
+
+
+def create_article_titles(df):
+    '''
+    INPUT:
+    df - pandas dataframe with article_id, title columns
+
+    OUTPUT:
+    article_titles - (dict) article_id (float) -> title
+    '''
+    titles = df.drop_duplicates('article_id')
+    return dict(zip(titles['article_id'], titles['title']))
+
+
+def create_user_articles(df):
+    '''
+    INPUT:
+    df - pandas dataframe with article_id, user_id columns
+
+    OUTPUT:
+    user_articles - (dict) user_id -> numpy array of the article ids (floats)
+                    the user interacted with, sorted by article id
+    '''
+    pairs = df[['user_id', 'article_id']].drop_duplicates()
+    pairs = pairs.sort_values(['user_id', 'article_id'])
+    user_ids, starts = np.unique(pairs['user_id'].values, return_index=True)
+    return dict(zip(user_ids.tolist(), np.split(pairs['article_id'].values, starts[1:])))
+
+
+class RecommendationData:
+    '''
+    The interaction log and the article content, together with the structures the
+    recommenders work on (user_item, article_titles, user_articles).
+
+    Nothing is read or built before it is first used, creating the object is free.
+    The methods are the notebook functions bound to this data.
+
+    If emails_path is given, the email to user_id mapping is loaded from it before
+    the interactions are encoded and saved back afterwards, so user ids stay the
+    same across reloads and new logs. Likewise the TF-IDF matrix of the article
+    texts is loaded from content_path if it was fit on the current texts, and fit and
+    saved to it otherwise.
+    '''
+    def __init__(self, interactions_path=INTERACTIONS_PATH, articles_path=ARTICLES_PATH,
+                 sparse=False, emails_path=None, content_path=None):
+        self.interactions_path = interactions_path
+        self.articles_path = articles_path
+        self.sparse = sparse
+        self.emails_path = emails_path
+        self.content_path = content_path
+
+    @classmethod
+    def from_frames(cls, df, df_content=None, sparse=False, content_path=None):
+        '''
+        INPUT:
+        df - (pandas dataframe) interactions with article_id, title, user_id columns
+        df_content - (pandas dataframe) article content, read from articles_path if None
+        sparse - (bool) build user_item as a SparseUserItem
+        content_path - (str) see RecommendationData
+
+        OUTPUT:
+        data - (RecommendationData) working on the given frames
+        '''
+        data = cls(sparse=sparse, content_path=content_path)
+        data.df = df
+        if df_content is not None:
+            data.df_content = df_content
+        return data
+
+    @cached_property
+    def encoder(self):
+        if self.emails_path is None:
+            return EmailEncoder()
+        return EmailEncoder.load(self.emails_path)
+
+    @cached_property
+    def df(self):
+        df = map_emails(load_interactions(self.interactions_path), self.encoder)
+        if self.emails_path is not None:
+            self.encoder.save(self.emails_path)
+        return df
+
+    @cached_property
+    def df_content(self):
+        return load_articles(self.articles_path)
+
+    @cached_property
+    def user_item(self):
+        return create_user_item_matrix(self.df, sparse=self.sparse)
+
+    @cached_property
+    def article_titles(self):
+        return create_article_titles(self.df)
+
+    @cached_property
+    def content_titles(self):
+        return create_content_titles(self.article_titles, self.df_content)
+
+    @cached_property
+    def user_articles(self):
+        return create_user_articles(self.df)
+
+    @cached_property
+    def content_index(self):
+        texts = article_texts(self.df, self.df_content)
+        if self.content_path is not None and os.path.exists(self.content_path):
+            content_index = TfidfIndex.load(self.content_path)
+            if content_index.source_digest == texts_digest(texts):
+                return content_index
+        content_index = TfidfIndex.fit(texts)
+        if self.content_path is not None:
+            content_index.save(self.content_path)
+        return content_index
+
+    @property
+    def popularity(self):
+        return get_popularity_table(self.df)
+
+    def get_top_articles(self, n):
+        return get_top_articles(n, self.df)
+
+    def get_top_article_ids(self, n):
+        return get_top_article_ids(n, self.df)
+
+    def find_similar_users(self, user_id, k=None):
+        return find_similar_users(user_id, self.user_item, k=k)
+
+    def get_top_sorted_users(self, user_id, k=None):
+        return get_top_sorted_users(user_id, self.user_item, k=k)
+
+    def get_article_names(self, article_ids):
+        return get_article_names(article_ids, self.article_titles)
+
+    def get_user_articles(self, user_id):
+        return get_user_articles(user_id, user_articles=self.user_articles,
+                                 article_titles=self.article_titles)
+
+    def user_user_recs(self, user_id, m=10):
+        return user_user_recs(user_id, m, user_item=self.user_item)
+
+    def user_user_recs_part2(self, user_id, m=10):
+        return user_user_recs_part2(user_id, m, df=self.df, user_item=self.user_item,
+                                    article_titles=self.article_titles)
+
+    def make_content_recs(self, article_ids, m=10):
+        return make_content_recs(article_ids, m, content_index=self.content_index,
+                                 article_titles=self.content_titles)
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .cache import decode_strings, encode_strings
+from .instrument import timed
+
+
+class EmailEncoder:
+    '''
+    Maps emails to user ids, numbered from 1 in the order the emails were first seen.
+    All null emails map to the same user.
+
+    emails - (pandas index) the known emails, the email of user_id i is emails[i - 1]
+
+    The mapping only ever grows: encoding new data keeps the ids of the known emails
+    and numbers the unseen ones after them, so ids stay stable across reloads as long
+    as the encoder is saved and loaded again.
+    '''
+    def __init__(self, emails=()):
+        self.emails = pd.Index(emails, dtype=object)
+
+    def __len__(self):
+        return len(self.emails)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        INPUT:
+        path - (str) file written by save, an empty encoder is returned if it does not exist
+
+        OUTPUT:
+        encoder - (EmailEncoder) the saved mapping
+        '''
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as table:
+            return cls(decode_strings(table['codes'], table['data'], table['offsets']))
+
+    def save(self, path):
+        '''
+        INPUT:
+        path - (str) .npz file to write the mapping to, the emails in user_id order as
+               utf-8 bytes and offsets like the string columns of the csv cache (see
+               cache.encode_strings), so a long email does not widen every entry. The
+               file is replaced atomically, a reader never sees a partial mapping
+        '''
+        codes, data, offsets = encode_strings(self.emails.values)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, codes=codes, data=data, offsets=offsets)
+        os.replace(tmp_path, path)
+
+    @timed('encode')
+    def encode(self, emails):
+        '''
+        INPUT:
+        emails - (array-like) the email of every row
+
+        OUTPUT:
+        user_ids - (numpy array) the user_id of every row, unseen emails are added
+                   to the mapping
+        '''
+        codes, uniques = pd.factorize(pd.Series(emails), use_na_sentinel=False)
+        uniques = pd.Index(uniques, dtype=object)
+        ids = self.emails.get_indexer(uniques)
+        unseen = ids == -1
+        ids[unseen] = len(self.emails) + np.arange(unseen.sum())
+        if unseen.any():
+            self.emails = self.emails.append(uniques[unseen])
+        return ids[codes] + 1
+
+    def decode(self, user_ids):
+        '''
+        INPUT:
+        user_ids - (array-like) user ids returned by encode
+
+        OUTPUT:
+        emails - (numpy array) the email of each user
+        '''
+        return self.emails.values[np.asarray(user_ids) - 1]
@@ -0,0 +1,221 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .als import ALSModel
+from .collaborative import batch_user_user_recs_part2
+from .factorization import SVDModel
+from .item_item import ItemItemModel
+from .matrix import (create_user_item_matrix, get_article_id_strings, top_k_indices,
+                     user_item_values_at, user_rows)
+from .ranking import get_article_ranks
+
+
+# the EvaluationData of the running evaluate call, forked workers inherit it
+_shared = {}
+
+
+class EvaluationData:
+    '''
+    A train/test split prepared for evaluate.
+
+    df_train - (pandas dataframe) the training interactions
+    user_item - (SparseUserItem) the user_item matrix of df_train
+    user_ids - (numpy array) the evaluated users: in the training data and with test
+               interactions with articles they did not see in training
+    relevant - (dict) user_id -> set of those test article ids, as strings like '1024.0'
+    '''
+    def __init__(self, df_train, df_test):
+        self.df_train = df_train
+        self.user_item = create_user_item_matrix(df_train, sparse=True)
+
+        pairs = df_test[['user_id', 'article_id']].drop_duplicates()
+        pairs = pairs[pairs['user_id'].isin(self.user_item.index)]
+        train_pairs = df_train[['user_id', 'article_id']].drop_duplicates()
+        pairs = pairs.merge(train_pairs, how='left', indicator=True)
+        pairs = pairs[pairs['_merge'] == 'left_only']
+        self.relevant = {user_id: set(str(x) for x in articles)
+                         for user_id, articles in pairs.groupby('user_id')['article_id']}
+        self.user_ids = np.array(sorted(self.relevant))
+
+
+def top_unseen(scores, user_item, rows, m):
+    '''
+    INPUT:
+    scores - (numpy array) len(rows) x n_articles, higher is better
+    user_item - (SparseUserItem) matrix of users by articles
+    rows - (numpy array) row positions of the query users
+    m - (int) the number of recommendations per user
+
+    OUTPUT:
+    recs - (list of lists) the article ids (as strings) of the m best scored articles
+           each user has not seen, articles scored -inf are left out
+    '''
+    scores = np.array(scores, dtype=float)
+    scores[user_item_values_at(user_item, rows) > 0] = -np.inf
+    top_idx = top_k_indices(scores, m)
+    found = np.take_along_axis(scores, top_idx, axis=1) > -np.inf
+    article_ids = get_article_id_strings(user_item)
+    return [article_ids[idx[keep]].tolist() for idx, keep in zip(top_idx, found)]
+
+
+def popular_recs(data, user_ids, m):
+    '''
+    The most popular articles of the training data the user has not seen
+    '''
+    rank = get_article_ranks(data.user_item.columns, data.df_train)
+    scores = np.tile(-rank.astype(float), (len(user_ids), 1))
+    return top_unseen(scores, data.user_item, user_rows(data.user_item, user_ids), m)
+
+
+def user_user_batch_recs(data, user_ids, m, k=None):
+    '''
+    user_user_recs_part2 of every user, using the k best neighbors
+    '''
+    recs = batch_user_user_recs_part2(user_ids, m, df=data.df_train, user_item=data.user_item,
+                                      k=k)
+    return [[rec for rec in row if rec is not None] for row in recs]
+
+
+def svd_recs(data, user_ids, m, k=None, method='full', **kwargs):
+    '''
+    The articles with the highest reconstructed interaction using k latent features
+    '''
+    model = SVDModel.fit(data.user_item, k=k, method=method, **kwargs)
+    return top_unseen(model.predict(user_ids), data.user_item,
+                      user_rows(data.user_item, user_ids), m)
+
+
+def als_recs(data, user_ids, m, random_state=0, **params):
+    '''
+    The articles with the highest preference of an ALSModel, params see ALSModel.fit.
+    Seeded, so evaluating the same config twice scores the same model
+    '''
+    model = ALSModel.fit(data.user_item, random_state=random_state, **params)
+    return top_unseen(model.predict(user_ids), data.user_item,
+                      user_rows(data.user_item, user_ids), m)
+
+
+def item_item_batch_recs(data, user_ids, m, k=20, cosine=False):
+    '''
+    ItemItemModel recommendations with k neighbors per article
+    '''
+    model = ItemItemModel.fit(data.user_item, k=k, cosine=cosine)
+    return model.recommend(user_ids, data.user_item, m)
+
+
+# recommender name -> function(data, user_ids, m, **params) returning lists of article ids
+RECOMMENDERS = {
+    'popular': popular_recs,
+    'user_user': user_user_batch_recs,
+    'svd': svd_recs,
+    'item_item': item_item_batch_recs,
+    'als': als_recs,
+}
+
+
+def score_recs(recs, user_ids, relevant, m):
+    '''
+    INPUT:
+    recs - (list of lists) the recommended article ids (as strings) of each user
+    user_ids - (numpy array) the users recs belong to
+    relevant - (dict) user_id -> set of relevant article ids, see EvaluationData
+    m - (int) the number of recommendations asked for
+
+    OUTPUT:
+    scores - (pandas dataframe) one row per user with user_id, n_recs, hits,
+             precision (hits / m) and recall (hits / number of relevant articles)
+    '''
+    hits = np.array([len(relevant[user_id].intersection(user_recs))
+                     for user_id, user_recs in zip(user_ids, recs)])
+    n_relevant = np.array([len(relevant[user_id]) for user_id in user_ids])
+    return pd.DataFrame({'user_id': user_ids,
+                         'n_recs': [len(user_recs) for user_recs in recs],
+                         'hits': hits,
+                         'precision': hits / m,
+                         'recall': hits / n_relevant})
+
+
+def evaluate_config(config, m):
+    '''
+    INPUT:
+    config - (dict) name, recommender (a key of RECOMMENDERS) and params
+    m - (int) the number of recommendations per user
+
+    OUTPUT:
+    summary - (dict) the mean metrics of the config and its wall time in seconds
+    scores - (pandas dataframe) the per user metrics, see score_recs
+    '''
+    data = _shared['data']
+    start = time.perf_counter()
+    recs = RECOMMENDERS[config['recommender']](data, data.user_ids, m, **config['params'])
+    seconds = time.perf_counter() - start
+
+    scores = score_recs(recs, data.user_ids, data.relevant, m)
+    recommended = set(rec for user_recs in recs for rec in user_recs)
+    summary = {'name': config['name'],
+               'precision': scores['precision'].mean(),
+               'recall': scores['recall'].mean(),
+               'user_coverage': (scores['n_recs'] > 0).mean(),
+               'catalog_coverage': len(recommended) / data.user_item.shape[1],
+               'n_users': len(scores),
+               'seconds': seconds}
+    scores.insert(0, 'name', config['name'])
+    return summary, scores
+
+
+def share_data(data):
+    '''
+    Makes data the EvaluationData evaluate_config works on in this process
+    '''
+    _shared['data'] = data
+
+
+def evaluate(configs, df_train, df_test, m=10, n_workers=None):
+    '''
+    INPUT:
+    configs - (list of dicts) recommender (a key of RECOMMENDERS), optional params
+              (dict of keyword arguments) and optional name, e.g.
+              {'recommender': 'svd', 'params': {'k': 50}}
+    df_train - training dataframe
+    df_test - test dataframe
+    m - (int) the number of recommendations per user, the k of precision@k and recall@k
+    n_workers - (int) worker processes, one per cpu if None, 1 to run in this process
+
+    OUTPUT:
+    summary - (pandas dataframe) one row per config with the mean precision and recall
+              over the evaluated users, the share of users with any recommendation
+              (user_coverage), the share of articles recommended to anyone
+              (catalog_coverage) and the wall time of the config in seconds
+    scores - (pandas dataframe) the per user metrics of every config, see score_recs
+
+    Description:
+    The configs run in a process pool. The training matrices are built once, forked
+    workers share them read-only with this process, on platforms without fork
+    every worker gets a copy
+    '''
+    configs = [{'recommender': config['recommender'],
+                'params': config.get('params', {}),
+                'name': config.get('name') or ' '.join(
+                    [config['recommender']] + ['{}={}'.format(key, value) for key, value
+                                               in config.get('params', {}).items()])}
+               for config in configs]
+    data = EvaluationData(df_train, df_test)
+    share_data(data)
+
+    if n_workers == 1:
+        results = [evaluate_config(config, m) for config in configs]
+    else:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            pool = ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context('fork'))
+        else:
+            pool = ProcessPoolExecutor(n_workers, initializer=share_data, initargs=(data,))
+        with pool:
+            results = list(pool.map(evaluate_config, configs, [m] * len(configs)))
+
+    summary = pd.DataFrame([result[0] for result in results]).set_index('name')
+    scores = pd.concat([result[1] for result in results], ignore_index=True)
+    return summary, scores
@@ -0,0 +1,397 @@
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, issparse
+from scipy.sparse.linalg import svds
+
+from .instrument import timed
+from .matrix import top_k_indices, user_item_data, user_rows
+
+
+def full_svd(matrix, k=None):
+    '''
+    INPUT:
+    matrix - (numpy array or scipy sparse matrix) users by articles
+    k - (int) the number of latent features to keep, all of them if None
+
+    OUTPUT:
+    u - (numpy array) n_users x k left singular vectors
+    s - (numpy array) the k largest singular values, largest first
+    vt - (numpy array) k x n_articles right singular vectors
+
+    Description:
+    Dense LAPACK SVD. Only the thin factors are computed, so u is n_users x n_articles
+    at most instead of n_users x n_users
+    '''
+    if issparse(matrix):
+        matrix = matrix.toarray()
+    u, s, vt = np.linalg.svd(matrix, full_matrices=False)
+    return u[:, :k], s[:k], vt[:k, :]
+
+
+def truncated_svd(matrix, k):
+    '''
+    INPUT:
+    matrix - (numpy array or scipy sparse matrix) users by articles
+    k - (int) the number of latent features, must be smaller than both dimensions
+
+    OUTPUT:
+    u - (numpy array) n_users x k left singular vectors
+    s - (numpy array) the k largest singular values, largest first
+    vt - (numpy array) k x n_articles right singular vectors
+
+    Description:
+    Lanczos iterations (ARPACK) on the matrix as given, a sparse matrix is only
+    ever multiplied with vectors and never made dense
+    '''
+    matrix = matrix.astype(np.float64)
+    u, s, vt = svds(matrix, k=k)
+    # svds does not return the singular values largest first
+    order = np.argsort(s)[::-1]
+    return u[:, order], s[order], vt[order, :]
+
+
+def randomized_svd(matrix, k, n_oversamples=10, n_power_iter=2, random_state=None):
+    '''
+    INPUT:
+    matrix - (numpy array or scipy sparse matrix) users by articles
+    k - (int) the number of latent features
+    n_oversamples - (int) extra random directions sampled on top of k,
+                    more give a better approximation of the k-th factors
+    n_power_iter - (int) power iterations, each one costs two more products with
+                   the matrix and sharpens the separation of the singular values
+    random_state - (int) seed for the random projection
+
+    OUTPUT:
+    u - (numpy array) n_users x k left singular vectors
+    s - (numpy array) the k largest singular values, largest first
+    vt - (numpy array) k x n_articles right singular vectors
+
+    Description:
+    Randomized range finder (Halko, Martinsson & Tropp): projects the matrix on
+    k + n_oversamples random directions, finds an orthonormal basis Q of that range
+    and takes the exact SVD of the small matrix Q.T @ matrix
+    '''
+    matrix = matrix.astype(np.float64)
+    rng = np.random.default_rng(random_state)
+    n_random = min(k + n_oversamples, min(matrix.shape))
+
+    q = matrix @ rng.standard_normal((matrix.shape[1], n_random))
+    for _ in range(n_power_iter):
+        # orthonormalize between products to keep the small directions from vanishing
+        q, _ = np.linalg.qr(q)
+        q = matrix @ (matrix.T @ q)
+    q, _ = np.linalg.qr(q)
+
+    b = (matrix.T @ q).T
+    u_b, s, vt = np.linalg.svd(b, full_matrices=False)
+    u = q @ u_b
+    return u[:, :k], s[:k], vt[:k, :]
+
+
+@timed('svd', size=lambda factors: len(factors[1]))
+def svd(matrix, k=None, method='full', **kwargs):
+    '''
+    INPUT:
+    matrix - (numpy array or scipy sparse matrix) users by articles
+    k - (int) the number of latent features, required for 'truncated' and 'randomized'
+    method - (str) 'full', 'truncated' or 'randomized'
+    kwargs - passed on to randomized_svd
+
+    OUTPUT:
+    u, s, vt - the top k factors, see full_svd
+    '''
+    if method == 'full':
+        return full_svd(matrix, k)
+    if k is None:
+        raise ValueError("k is required for the '{}' method".format(method))
+    if method == 'truncated':
+        return truncated_svd(matrix, k)
+    if method == 'randomized':
+        return randomized_svd(matrix, k, **kwargs)
+    raise ValueError("Unknown SVD method '{}'".format(method))
+
+
+def reconstruction_errors(u, s, vt, actual, ks, observed_only=False, block_size=1024):
+    '''
+    INPUT:
+    u, s, vt - (numpy arrays) factors of an SVD, see full_svd
+    actual - (numpy array or scipy sparse matrix) the values to compare with,
+             shaped like u @ vt
+    ks - (list of ints) increasing numbers of latent features to evaluate
+    observed_only - (bool) only count the nonzero cells of actual, the interactions
+                    that were observed, instead of every cell
+    block_size - (int) the number of rows (or observed cells) handled at once,
+                 bounds the memory to block_size x n_articles floats
+
+    OUTPUT:
+    errs - (numpy array) for every k the summed absolute difference between actual
+           and the rounded rank-k reconstruction
+
+    Description:
+    Works through actual in blocks. Within a block the reconstruction is built up
+    incrementally, going from one k to the next only adds the rank slices in
+    between, scaled by s, so no diagonal matrix or full reconstruction is ever
+    materialized
+    '''
+    ks = np.asarray(ks)
+    if np.any(np.diff(ks) <= 0):
+        raise ValueError('ks must be increasing')
+    errs = np.zeros(len(ks))
+
+    if observed_only:
+        rows, cols = actual.nonzero()
+        values = np.asarray(actual[rows, cols], dtype=np.float64).ravel()
+        for start in range(0, len(rows), block_size):
+            r = rows[start:start + block_size]
+            c = cols[start:start + block_size]
+            v = values[start:start + block_size]
+            est = np.zeros(len(r))
+            prev = 0
+            for i, k in enumerate(ks):
+                est += np.einsum('ij,j,ji->i', u[r, prev:k], s[prev:k], vt[prev:k, c])
+                prev = k
+                errs[i] += np.abs(v - np.around(est)).sum()
+        return errs
+
+    for start in range(0, actual.shape[0], block_size):
+        block = actual[start:start + block_size]
+        block = block.toarray() if issparse(block) else np.asarray(block)
+        est = np.zeros(block.shape)
+        prev = 0
+        for i, k in enumerate(ks):
+            est += (u[start:start + block_size, prev:k] * s[prev:k]) @ vt[prev:k, :]
+            prev = k
+            errs[i] += np.abs(block - np.around(est)).sum()
+    return errs
+
+
+def plot_accuracy(num_latent_feats, sum_errs, n_interactions):
+    '''
+    INPUT:
+    num_latent_feats - (list of ints) the evaluated numbers of latent features
+    sum_errs - (list) the summed errors for each of them, see reconstruction_errors
+    n_interactions - (int) the number of interactions the accuracy is relative to
+
+    Description:
+    Plots accuracy against the number of latent features. matplotlib is only
+    imported here, the rest of the package does not need it
+    '''
+    import matplotlib.pyplot as plt
+
+    plt.plot(num_latent_feats, 1 - np.array(sum_errs) / n_interactions)
+    plt.xlabel('Number of Latent Features')
+    plt.ylabel('Accuracy')
+    plt.title('Accuracy vs. Number of Latent Features')
+    plt.show()
+
+
+class SVDModel:
+    '''
+    A latent factor model, the factors of an SVD of a user_item matrix.
+
+    u, s, vt - (numpy arrays) the factors, see full_svd
+    index - (pandas index) the user_id of each row of u
+    columns - (pandas index) the article_id of each column of vt
+
+    index and columns are named like those of the user_item matrix the model was fit on.
+
+    A saved model is a directory of .npy files. Loading maps the factors read-only
+    instead of reading them, so processes that load the same model share one copy
+    of it in the page cache.
+    '''
+    def __init__(self, u, s, vt, index, columns):
+        self.u = u
+        self.s = s
+        self.vt = vt
+        self.index = index
+        self.columns = columns
+
+    @classmethod
+    def fit(cls, user_item, k=None, method='full', **kwargs):
+        '''
+        INPUT:
+        user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+        k, method, kwargs - see svd
+
+        OUTPUT:
+        model - (SVDModel) fit on user_item
+        '''
+        u, s, vt = svd(user_item_data(user_item), k=k, method=method, **kwargs)
+        return cls(u, s, vt, user_item.index, user_item.columns)
+
+    def predict(self, user_ids, k=None):
+        '''
+        INPUT:
+        user_ids - (int or list of ints) users the model was fit on
+        k - (int) the number of latent features to use, all of them if None
+
+        OUTPUT:
+        scores - (numpy array) len(user_ids) x n_articles reconstructed interactions
+        '''
+        rows = user_rows(self, user_ids)
+        return (self.u[rows, :k] * self.s[:k]) @ self.vt[:k, :]
+
+    def history_matrix(self, histories):
+        '''
+        INPUT:
+        histories - (list of lists) the article ids each user saw, as floats or strings
+                    like '1024.0'
+
+        OUTPUT:
+        matrix - (scipy csr matrix) len(histories) x n_articles, 1 for the articles
+                 seen, like the rows of user_item. Articles the model does not know
+                 are left out
+        '''
+        positions = [self.columns.get_indexer([float(x) for x in history])
+                     for history in histories]
+        positions = [np.unique(p[p >= 0]) for p in positions]
+        indptr = np.cumsum([0] + [len(p) for p in positions])
+        indices = np.concatenate(positions + [np.empty(0, dtype=int)])
+        return csr_matrix((np.ones(len(indices)), indices, indptr),
+                          shape=(len(histories), len(self.columns)))
+
+    def batch_fold_in(self, histories, m=10, k=None):
+        '''
+        INPUT:
+        histories - (list of lists) the article ids seen by each new user, see
+                    history_matrix
+        m - (int) the number of recommendations per user
+        k - (int) the number of latent features to use, all of them if None
+
+        OUTPUT:
+        scores - (numpy array) len(histories) x n_articles reconstructed interactions
+        recs - (list of lists) for each user the m unseen articles (as strings) with
+               the highest scores, ties in article_id order. Empty for users
+               without known articles
+
+        Description:
+        Users that were not in the matrix the model was fit on are projected onto
+        its factors: the row of u of an interaction vector r is r vt' / s, so the
+        reconstruction is r vt' vt. That takes two products with vt, no refit.
+        Users without known articles score 0 everywhere and get no recommendations,
+        use get_top_article_ids for them
+        '''
+        matrix = self.history_matrix(histories)
+        vt = self.vt[:k, :]
+        scores = np.asarray(matrix @ vt.T) @ vt
+        ranked = scores.copy()
+        ranked[matrix.toarray() > 0] = -np.inf
+        top_idx = top_k_indices(ranked, m)
+        found = np.take_along_axis(ranked, top_idx, axis=1) > -np.inf
+        found[np.diff(matrix.indptr) == 0] = False
+        article_ids = np.array([str(x) for x in self.columns], dtype=object)
+        return scores, [article_ids[idx[keep]].tolist() for idx, keep in zip(top_idx, found)]
+
+    def fold_in(self, article_ids, m=10, k=None):
+        '''
+        INPUT:
+        article_ids - (list) the articles a new user saw, see history_matrix
+        m, k - see batch_fold_in
+
+        OUTPUT:
+        scores - (numpy array) the reconstructed interaction with every article
+        recs - (list) the m unseen articles (as strings) with the highest scores
+        '''
+        scores, recs = self.batch_fold_in([article_ids], m, k)
+        return scores[0], recs[0]
+
+    def fold_in_factors(self, histories, k=None):
+        '''
+        INPUT:
+        histories - (list of lists) see history_matrix
+        k - (int) the number of latent features to use, all of them if None
+
+        OUTPUT:
+        u - (numpy array) len(histories) x k rows like those of u for the new users,
+            0 for features whose singular value is zero up to rounding, i.e. at most
+            s[0] * max(vt.shape) * eps like the rank cutoff of np.linalg.matrix_rank
+        '''
+        s = self.s[:k]
+        vt = self.vt[:k, :]
+        projected = np.asarray(self.history_matrix(histories) @ vt.T)
+        cutoff = s[0] * max(vt.shape) * np.finfo(s.dtype).eps if len(s) else 0
+        return np.divide(projected, s, out=np.zeros_like(projected), where=s > cutoff)
+
+    def save(self, path):
+        '''
+        INPUT:
+        path - (str) where to save the model
+
+        Description:
+        Writes the factors and the index maps into a new directory next to path and
+        then points the symlink path at it with an atomic rename, so a load never sees
+        a half written model. The directory of the replaced model is kept for loads
+        that resolved path before the rename, the ones before it are removed.
+        Processes that still map a removed model keep their pages until they load
+        again
+        '''
+        path = os.path.abspath(path)
+        directory = '{}.{}'.format(path, uuid.uuid4().hex)
+        os.makedirs(directory)
+        for name in ('u', 's', 'vt'):
+            np.save(os.path.join(directory, name + '.npy'),
+                    np.ascontiguousarray(getattr(self, name)))
+        np.save(os.path.join(directory, 'index.npy'), self.index.values)
+        np.save(os.path.join(directory, 'columns.npy'), self.columns.values)
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'index_name': self.index.name, 'columns_name': self.columns.name}, f)
+
+        previous = os.path.realpath(path) if os.path.islink(path) else None
+        tmp_link = directory + '.link'
+        os.symlink(os.path.basename(directory), tmp_link)
+        os.replace(tmp_link, path)
+        keep = {directory, previous}
+        for old in model_generations(path):
+            if old not in keep:
+                shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        '''
+        INPUT:
+        path - (str) a model written by save
+        mmap_mode - (str) passed to np.load for the factors, None to read them into memory
+
+        OUTPUT:
+        model - (SVDModel) the saved model
+
+        Description:
+        If the model is removed while it is read, because two saves replaced it in
+        the meantime, the model path points to now is read instead
+        '''
+        while True:
+            directory = os.path.realpath(path)
+            try:
+                u, s, vt = [np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+                            for name in ('u', 's', 'vt')]
+                with open(os.path.join(directory, 'meta.json')) as f:
+                    meta = json.load(f)
+                index = pd.Index(np.load(os.path.join(directory, 'index.npy')),
+                                 name=meta['index_name'])
+                columns = pd.Index(np.load(os.path.join(directory, 'columns.npy')),
+                                   name=meta['columns_name'])
+                return cls(u, s, vt, index, columns)
+            except FileNotFoundError:
+                if os.path.realpath(path) == directory:
+                    raise
+
+
+def model_generations(path):
+    '''
+    INPUT:
+    path - (str) absolute path of a model written by SVDModel.save
+
+    OUTPUT:
+    directories - (list of str) every model directory saved for path, see SVDModel.save
+    '''
+    parent, name = os.path.split(path)
+    prefix = name + '.'
+    return [os.path.join(parent, entry) for entry in os.listdir(parent)
+            if entry.startswith(prefix) and len(entry) == len(prefix) + 32
+            and all(c in '0123456789abcdef' for c in entry[len(prefix):])
+            and os.path.isdir(os.path.join(parent, entry))]
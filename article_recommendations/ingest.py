@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from .data import create_article_titles
+from .matrix import create_sparse_user_item_matrix, set_cached_for_matrix
+from .ranking import set_popularity_table
+
+
+class InteractionStore:
+    '''
+    The interaction log together with the structures derived from it, updated batch
+    by batch as new interactions arrive instead of being rebuilt from the whole log.
+
+    user_item - (SparseUserItem) changed in place by append, rows and columns stay
+                sorted by id like create_user_item_matrix sorts them
+    article_ids - (pandas index) every article seen, in the order of first appearance
+    article_counts - (numpy array) the number of interactions with each of article_ids
+    article_titles - (dict) article_id -> title of its first interaction
+    version - (int) the number of batches appended, also set on user_item so the
+              values cached for the matrix (see cached_for_matrix) are recomputed
+
+    df, user_item and article_titles can be passed to the recommenders like the ones
+    built by RecommendationData.
+    '''
+    def __init__(self, df):
+        self.batches = [df]
+        self.user_item = create_sparse_user_item_matrix(df)
+        codes, self.article_ids = pd.factorize(df['article_id'])
+        self.article_counts = np.bincount(codes, minlength=len(self.article_ids))
+        self.article_titles = create_article_titles(df)
+        self.version = 0
+        self._df = df
+        self._popularity = None
+
+    @property
+    def df(self):
+        '''
+        The whole log as one dataframe, concatenated on first use after an append.
+        Its popularity table is the incrementally updated one, get_popularity_table
+        does not count it again
+        '''
+        if self._df is None:
+            self._df = pd.concat(self.batches, ignore_index=True)
+            self.batches = [self._df]
+            set_popularity_table(self._df, self.popularity)
+        return self._df
+
+    @property
+    def popularity(self):
+        '''
+        The popularity table of the log, see create_popularity_table
+        '''
+        if self._popularity is None:
+            # a stable sort of the first appearance order breaks ties like value_counts
+            order = np.argsort(-self.article_counts, kind='stable')
+            article_ids = self.article_ids[order]
+            self._popularity = pd.DataFrame(
+                {'title': [self.article_titles[article_id] for article_id in article_ids],
+                 'count': self.article_counts[order],
+                 'rank': np.arange(len(order))},
+                index=pd.Index(article_ids, name='article_id'))
+        return self._popularity
+
+    def append(self, events):
+        '''
+        INPUT:
+        events - (pandas dataframe) new interactions with article_id, title, user_id
+                 columns, users and articles may be new
+
+        Description:
+        Adds new users and articles as rows and columns of user_item and sets the
+        interactions, in O(nnz) without the pivot of create_user_item_matrix. Updates
+        the per-user counts and the article counts from the batch alone and bumps
+        the version
+        '''
+        user_item = self.user_item
+        index, user_positions = grow_index(user_item.index, events['user_id'])
+        columns, article_positions = grow_index(user_item.columns, events['article_id'])
+        matrix = resize_matrix(user_item.matrix, (len(index), len(columns)),
+                               user_positions, article_positions)
+        new = csr_matrix((np.ones(len(events)), (index.get_indexer(events['user_id']),
+                                                 columns.get_indexer(events['article_id']))),
+                         shape=matrix.shape)
+        matrix = matrix + new
+        # a user either saw an article or not
+        matrix.data[:] = 1
+        user_item.matrix, user_item.index, user_item.columns = matrix, index, columns
+
+        codes, batch_ids = pd.factorize(events['article_id'])
+        batch_counts = np.bincount(codes, minlength=len(batch_ids))
+        known = self.article_ids.get_indexer(batch_ids)
+        seen = known >= 0
+        self.article_counts[known[seen]] += batch_counts[seen]
+        batch_titles = create_article_titles(events)
+        for article_id in batch_ids[~seen]:
+            self.article_titles[article_id] = batch_titles[article_id]
+        self.article_ids = self.article_ids.append(batch_ids[~seen])
+        self.article_counts = np.concatenate([self.article_counts, batch_counts[~seen]])
+
+        self.batches.append(events)
+        self._df = None
+        self._popularity = None
+        self.version += 1
+        user_item.version = self.version
+        set_cached_for_matrix(user_item, 'num_interactions', np.diff(matrix.indptr))
+
+
+def grow_index(index, ids):
+    '''
+    INPUT:
+    index - (pandas index) sorted ids of the rows or columns of a matrix
+    ids - (array-like) ids that have to be in it
+
+    OUTPUT:
+    index - (pandas index) index with the new ids added, still sorted
+    positions - (numpy array) the new position of every entry of the old index,
+                None if the new ids all sort after the old ones and nothing moved
+    '''
+    new_ids = pd.Index(pd.unique(np.asarray(ids))).difference(index)
+    if len(new_ids) == 0:
+        return index, None
+    grown = index.append(new_ids).rename(index.name)
+    if grown.is_monotonic_increasing:
+        return grown, None
+    grown = grown.sort_values()
+    return grown, grown.get_indexer(index)
+
+
+def resize_matrix(matrix, shape, row_positions=None, column_positions=None):
+    '''
+    INPUT:
+    matrix - (scipy csr matrix) the old matrix
+    shape - (tuple) the new shape, at least as large as the old one
+    row_positions, column_positions - (numpy arrays) new position of every old row
+                                      and column, None where they did not move
+
+    OUTPUT:
+    matrix - (scipy csr matrix) the entries of the old matrix at their new positions,
+             the old matrix itself resized in place if nothing moved
+    '''
+    if row_positions is None and column_positions is None:
+        matrix.resize(shape)
+        return matrix
+    coo = matrix.tocoo()
+    rows = coo.row if row_positions is None else row_positions[coo.row]
+    cols = coo.col if column_positions is None else column_positions[coo.col]
+    return csr_matrix((coo.data, (rows, cols)), shape=shape)
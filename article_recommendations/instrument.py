@@ -0,0 +1,179 @@
+import cProfile
+import functools
+import json
+import logging
+import math
+import pstats
+import threading
+import time
+from collections import Counter
+
+
+logger = logging.getLogger('article_recommendations')
+
+# set by enable and disable, the timed functions only measure while it is True
+enabled = False
+_stages = {}
+_lock = threading.Lock()
+
+
+class StageStats:
+    '''
+    The measurements of one stage.
+
+    calls - (int) the number of timed calls
+    seconds, max_seconds - (float) their total and longest wall time
+    latency - (Counter) power of two bucket (upper bound in microseconds) -> calls
+    sizes - (Counter) power of two bucket (upper bound) -> calls with a result that size
+    '''
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.latency = Counter()
+        self.sizes = Counter()
+
+    def add(self, seconds, size=None):
+        self.calls += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.latency[bucket(seconds * 1e6)] += 1
+        if size is not None:
+            self.sizes[bucket(size)] += 1
+
+    def snapshot(self):
+        '''
+        OUTPUT:
+        stats - (dict) the counters with times in milliseconds and the histograms
+                keyed by '<=' their bucket's upper bound, smallest first
+        '''
+        return {'calls': self.calls,
+                'total_ms': self.seconds * 1000,
+                'mean_ms': self.seconds * 1000 / self.calls if self.calls else 0.0,
+                'max_ms': self.max_seconds * 1000,
+                'latency_us': {'<={}'.format(key): self.latency[key]
+                               for key in sorted(self.latency)},
+                'size': {'<={}'.format(key): self.sizes[key] for key in sorted(self.sizes)}}
+
+
+def bucket(value):
+    '''
+    OUTPUT:
+    upper - (int) the smallest power of two at least value, 0 for values up to 0
+    '''
+    return 0 if value <= 0 else 1 << (math.ceil(value) - 1).bit_length()
+
+
+def enable():
+    '''
+    Starts timing the instrumented functions, see timed
+    '''
+    global enabled
+    enabled = True
+
+
+def disable():
+    '''
+    Stops timing, the stats collected so far are kept
+    '''
+    global enabled
+    enabled = False
+
+
+def reset():
+    '''
+    Drops the stats of every stage
+    '''
+    with _lock:
+        _stages.clear()
+
+
+def record(stage, seconds, size=None):
+    '''
+    INPUT:
+    stage - (str) the stage name, e.g. 'similarity'
+    seconds - (float) the wall time of one call
+    size - (int) the size of its result, None if it has none
+    '''
+    with _lock:
+        if stage not in _stages:
+            _stages[stage] = StageStats()
+        _stages[stage].add(seconds, size)
+
+
+def snapshot():
+    '''
+    OUTPUT:
+    stats - (dict) stage -> StageStats.snapshot of every stage timed so far
+    '''
+    with _lock:
+        return {stage: stats.snapshot() for stage, stats in sorted(_stages.items())}
+
+
+def snapshot_json(**kwargs):
+    '''
+    OUTPUT:
+    stats - (str) snapshot as JSON, kwargs are passed on to json.dumps
+    '''
+    return json.dumps(snapshot(), **kwargs)
+
+
+def timed(stage, size=len):
+    '''
+    INPUT:
+    stage - (str) the stage the decorated function belongs to
+    size - (function) takes the result and returns its size for the histogram
+
+    OUTPUT:
+    decorator - wraps a function so its calls are recorded while enabled is True.
+                While disabled a call only costs the check of the flag
+
+    Description:
+    Nested stages are all recorded, a stage calling another one includes its time.
+    Every recorded call is also logged as a debug event, see debug
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            result_size = size(result)
+            record(stage, seconds, result_size)
+            debug(stage, function=function.__name__, ms=seconds * 1000, size=result_size)
+            return result
+        return timed_function
+    return decorator
+
+
+def debug(event, **fields):
+    '''
+    INPUT:
+    event - (str) what happened
+    fields - the values to log with it, as JSON
+
+    Description:
+    Logs to the 'article_recommendations' logger at DEBUG level, the fields are
+    only formatted if that level is enabled, e.g. by
+    logging.getLogger('article_recommendations').setLevel(logging.DEBUG)
+    '''
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('%s %s', event, json.dumps(fields, default=str))
+
+
+def profile(function, *args, **kwargs):
+    '''
+    INPUT:
+    function - (function) e.g. a single request, data.user_user_recs_part2
+    args, kwargs - its arguments
+
+    OUTPUT:
+    result - what function returned
+    stats - (pstats.Stats) the cProfile of the call, e.g.
+            stats.sort_stats('cumulative').print_stats(20)
+    '''
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **kwargs)
+    return result, pstats.Stats(profiler)
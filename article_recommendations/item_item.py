@@ -0,0 +1,122 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .matrix import get_user_item_csc, top_k_indices, user_item_values_at, user_rows
+
+
+# bytes the dense co-occurrence rows of one block of articles may take while fitting
+ITEM_ITEM_MEMORY_BUDGET = 256 * 2 ** 20
+
+
+class ItemItemModel:
+    '''
+    The top k co-viewed articles of every article, from the co-occurrence matrix
+    X.T X of a binary user_item matrix X.
+
+    neighbors - (numpy array) int32 n_articles x k column positions of the neighbors,
+                the most co-viewed first, -1 where an article has fewer than k
+    scores - (numpy array) float32 n_articles x k, the number of users who saw both
+             articles, or its cosine normalization, 0 where neighbors is -1
+    columns - (pandas index) the article_id of each column of the matrix
+
+    Recommendations for a user sum the scores of the neighbors of the articles they
+    saw, which takes one sparse product with the neighbor lists. The cost does not
+    depend on the number of users.
+    '''
+    def __init__(self, neighbors, scores, columns):
+        self.neighbors = neighbors
+        self.scores = scores
+        self.columns = columns
+        self.matrix = self.neighbor_matrix()
+
+    @classmethod
+    def fit(cls, user_item, k=20, cosine=False, memory_budget=ITEM_ITEM_MEMORY_BUDGET):
+        '''
+        INPUT:
+        user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+        k - (int) the number of neighbors kept per article
+        cosine - (bool) divide the co-occurrence counts by the square root of the
+                 product of the two articles' numbers of users
+        memory_budget - (int) bytes the dense co-occurrence rows of one block of
+                        articles may take
+
+        OUTPUT:
+        model - (ItemItemModel) the neighbor lists
+
+        Description:
+        X.T X is computed for blocks of articles at a time, only the top k of each
+        row are kept. Ties are broken by column order
+        '''
+        csc = get_user_item_csc(user_item)
+        n_articles = csc.shape[1]
+        k = min(k, max(n_articles - 1, 0))
+        csr_t = csc.T.tocsr()
+        n_users = np.diff(csc.indptr).astype(float)
+        norms = np.sqrt(np.maximum(n_users, 1))
+
+        neighbors = np.empty((n_articles, k), dtype=np.int32)
+        scores = np.empty((n_articles, k), dtype=np.float32)
+        block = max(1, memory_budget // (8 * max(n_articles, 1)))
+        for start in range(0, n_articles, block):
+            end = min(start + block, n_articles)
+            co = csr_t[start:end].dot(csc).toarray().astype(float)
+            if cosine:
+                co /= norms[start:end, None] * norms[None, :]
+            # an article is not its own neighbor
+            co[np.arange(end - start), np.arange(start, end)] = -np.inf
+            top_idx = top_k_indices(co, k)
+            top_scores = np.take_along_axis(co, top_idx, axis=1)
+            empty = top_scores <= 0
+            neighbors[start:end] = np.where(empty, -1, top_idx)
+            scores[start:end] = np.where(empty, 0, top_scores)
+        return cls(neighbors, scores, user_item.columns)
+
+    def neighbor_matrix(self):
+        '''
+        OUTPUT:
+        matrix - (scipy csr matrix) n_articles x n_articles, the kept scores
+        '''
+        n_articles = self.neighbors.shape[0]
+        keep = self.neighbors >= 0
+        indptr = np.concatenate([[0], np.cumsum(keep.sum(axis=1))])
+        return csr_matrix((self.scores[keep], self.neighbors[keep], indptr),
+                          shape=(n_articles, n_articles))
+
+    def recommend(self, user_ids, user_item, m=10):
+        '''
+        INPUT:
+        user_ids - (int or list of ints) the query users
+        user_item - (pandas dataframe or SparseUserItem) the matrix the model was fit on,
+                    or a newer one with the same columns
+        m - (int) the number of recommendations per user
+
+        OUTPUT:
+        recs - (list of lists) for each user up to m article ids (as strings) they have
+               not seen, by the summed scores of the articles they saw, ties in
+               article_id order. Articles no seen article has as a neighbor are not
+               recommended
+        '''
+        rows = user_rows(user_item, user_ids)
+        seen = user_item_values_at(user_item, rows)
+        # row i of matrix holds the neighbors of article i, seen @ matrix sums them up
+        scores = self.matrix.T.dot(seen.T).T.astype(float)
+        scores[(seen > 0) | (scores <= 0)] = -np.inf
+        top_idx = top_k_indices(scores, m)
+        found = np.take_along_axis(scores, top_idx, axis=1) > -np.inf
+        article_ids = np.array([str(x) for x in self.columns], dtype=object)
+        return [article_ids[idx[keep]].tolist() for idx, keep in zip(top_idx, found)]
+
+
+def item_item_recs(user_id, m=10, *, model, user_item):
+    '''
+    INPUT:
+    user_id - (int) a user id
+    m - (int) the number of recommendations you want for the user
+    model - (ItemItemModel) see ItemItemModel.fit
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+
+    OUTPUT:
+    recs - (list) up to m article ids (as strings) the user has not seen, the articles
+           most co-viewed with the user's articles first
+    '''
+    return model.recommend(user_id, user_item, m)[0]
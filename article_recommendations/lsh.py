@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from .matrix import get_interaction_counts, user_item_data, user_rows
+from .similarity import top_similar_users
+
+
+# the hash functions are (a * column + b) mod MINHASH_PRIME, a column is an article index
+MINHASH_PRIME = 2 ** 31 - 1
+
+# bytes the hashed columns of one block of hash functions may take while signing
+SIGNATURE_MEMORY_BUDGET = 256 * 2 ** 20
+
+
+class MinHashLSH:
+    '''
+    An approximate neighbor index over the rows of a binary user_item matrix.
+
+    Every user gets a MinHash signature of n_bands * n_rows hashes of the articles
+    they saw. Two users agree on a hash with probability equal to the Jaccard
+    similarity of their articles. The signature is cut into n_bands bands of n_rows
+    hashes and users whose signatures agree on a whole band share a bucket. The
+    candidate neighbors of a user are the users sharing at least one bucket with
+    them, found with one binary search per band, and are re-ranked by the exact dot
+    product.
+
+    More bands find more of the true neighbors, more rows per band return fewer,
+    more similar candidates. Users become likely candidates of each other above a
+    Jaccard similarity of about (1 / n_bands) ** (1 / n_rows).
+
+    user_item - (pandas dataframe or SparseUserItem) the indexed matrix
+    keys - (numpy array) n_users x n_bands bucket key of every user in every band
+    band_orders - (list of numpy arrays) the row positions of the signed users of a
+                  band sorted by their key in that band
+    band_keys - (list of numpy arrays) the keys belonging to band_orders
+    signed - (numpy array) True for the users with at least one interaction
+    '''
+    def __init__(self, user_item, n_bands=32, n_rows=2, random_state=None):
+        self.user_item = user_item
+        self.n_bands = n_bands
+        self.n_rows = n_rows
+
+        rng = np.random.default_rng(random_state)
+        n_hashes = n_bands * n_rows
+        a = rng.integers(1, MINHASH_PRIME, n_hashes)
+        b = rng.integers(0, MINHASH_PRIME, n_hashes)
+        signatures = minhash_signatures(csr_matrix(user_item_data(user_item)), a, b)
+
+        # a band key mixes the n_rows hashes of the band, collisions only add candidates
+        multipliers = rng.integers(1, 2 ** 63, n_rows, dtype=np.uint64) | np.uint64(1)
+        bands = signatures.astype(np.uint64).reshape(n_bands, n_rows, -1)
+        self.keys = (bands * multipliers[None, :, None]).sum(axis=1).T
+
+        # users without interactions have no signature and are left out of the buckets
+        signed = np.flatnonzero(get_interaction_counts(user_item) > 0)
+        self.band_orders = []
+        self.band_keys = []
+        for band in range(n_bands):
+            order = signed[np.argsort(self.keys[signed, band], kind='stable')]
+            self.band_orders.append(order)
+            self.band_keys.append(self.keys[order, band])
+        self.signed = np.zeros(user_item.shape[0], dtype=bool)
+        self.signed[signed] = True
+
+    def candidate_rows(self, row):
+        '''
+        INPUT:
+        row - (int) row position of the query user
+
+        OUTPUT:
+        candidates - (numpy array) sorted row positions of the users sharing a bucket
+                     with the query user, without the query user
+        '''
+        if not self.signed[row]:
+            return np.empty(0, dtype=int)
+        members = []
+        for band, (order, keys) in enumerate(zip(self.band_orders, self.band_keys)):
+            key = self.keys[row, band]
+            start, end = np.searchsorted(keys, key, 'left'), np.searchsorted(keys, key, 'right')
+            members.append(order[start:end])
+        candidates = np.unique(np.concatenate(members))
+        return candidates[candidates != row]
+
+    def candidate_similarities(self, row):
+        '''
+        INPUT:
+        row - (int) row position of the query user
+
+        OUTPUT:
+        candidates - (numpy array) see candidate_rows
+        similarities - (numpy array) exact dot product of each candidate with the query
+        '''
+        candidates = self.candidate_rows(row)
+        return candidates, row_similarities(self.user_item, candidates, row)
+
+    def find_similar_users(self, user_id, k=None):
+        '''
+        INPUT:
+        user_id - (int) a user_id
+        k - (int) only return the k closest candidates, all of them if None
+
+        OUTPUT:
+        similar_users - (list) the candidate neighbors, ordered like find_similar_users:
+                        largest dot product first, then by user_id
+        '''
+        row = user_rows(self.user_item, user_id)[0]
+        candidates, similarities = self.candidate_similarities(row)
+        # candidates are sorted by row, so the stable sort keeps user_id order between ties
+        order = candidates[np.argsort(-similarities, kind='stable')][:k]
+        return np.asarray(self.user_item.index)[order].tolist()
+
+    def rank_neighbors(self, user_id, k=None):
+        '''
+        INPUT:
+        user_id - (int)
+        k - (int) only return the k best candidates, all of them if None
+
+        OUTPUT:
+        neighbor_ids, similarity, num_interactions - see similarity.rank_neighbors,
+            restricted to the candidate neighbors
+        '''
+        row = user_rows(self.user_item, user_id)[0]
+        candidates, similarities = self.candidate_similarities(row)
+        num_interactions = get_interaction_counts(self.user_item)[candidates]
+        ranked = np.lexsort((-num_interactions, -similarities))[:k]
+        return (np.asarray(self.user_item.index)[candidates[ranked]], similarities[ranked],
+                num_interactions[ranked])
+
+    def get_top_sorted_users(self, user_id, k=None):
+        '''
+        INPUT:
+        user_id - (int)
+        k - (int) only return the k best candidates, all of them if None
+
+        OUTPUT:
+        neighbors_df - (pandas dataframe) see similarity.get_top_sorted_users, restricted
+                       to the candidate neighbors
+        '''
+        neighbor_ids, similarity, num_interactions = self.rank_neighbors(user_id, k=k)
+        return pd.DataFrame({'neighbor_id': neighbor_ids,
+                             'similarity': similarity,
+                             'num_interactions': num_interactions})
+
+    def recall(self, user_ids, k=10):
+        '''
+        INPUT:
+        user_ids - (list of ints) the query users to measure on
+        k - (int) the number of neighbors compared
+
+        OUTPUT:
+        recall - (float) mean over the query users of the share of the exact top k
+                 neighbors (find_similar_users) the index returns in its top k
+
+        Description:
+        Users with the same similarity are interchangeable, so a returned neighbor
+        counts as found when it is as similar as the k-th exact neighbor. Exact
+        neighbors with similarity 0 are not counted, query users without any
+        neighbor are skipped
+        '''
+        recalls = []
+        for user_id in user_ids:
+            _, exact = top_similar_users(user_id, self.user_item, k=k)
+            exact = exact[0][exact[0] > 0]
+            if len(exact) == 0:
+                continue
+            row = user_rows(self.user_item, user_id)[0]
+            found = user_rows(self.user_item, self.find_similar_users(user_id, k=k))
+            similarities = row_similarities(self.user_item, found, row)
+            recalls.append(np.sum((similarities >= exact[-1]) & (similarities > 0)) / len(exact))
+        return float(np.mean(recalls)) if recalls else 1.0
+
+
+def row_similarities(user_item, rows, row):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    rows - (numpy array) row positions of the users to score
+    row - (int) row position of the query user
+
+    OUTPUT:
+    similarities - (numpy array) dot product of each of rows with the query user
+    '''
+    data = user_item_data(user_item)
+    similarities = data[rows].dot(data[row].T)
+    if hasattr(similarities, 'toarray'):
+        similarities = similarities.toarray()
+    return np.asarray(similarities, dtype=float).ravel()
+
+
+def minhash_signatures(matrix, a, b, memory_budget=SIGNATURE_MEMORY_BUDGET):
+    '''
+    INPUT:
+    matrix - (scipy csr matrix) users by articles
+    a, b - (numpy arrays) the parameters of the hash functions, see MINHASH_PRIME
+    memory_budget - (int) bytes the hashed columns of one block of hash functions may take
+
+    OUTPUT:
+    signatures - (numpy array) n_hashes x n_users, the minimum hash over the articles
+                 of each user. MINHASH_PRIME for users without articles
+    '''
+    n_users, n_articles = matrix.shape
+    signatures = np.full((len(a), n_users), MINHASH_PRIME, dtype=np.int64)
+    if matrix.nnz == 0:
+        return signatures
+    columns = np.arange(n_articles, dtype=np.int64)
+    starts = np.minimum(matrix.indptr[:-1], matrix.nnz - 1)
+    empty = np.diff(matrix.indptr) == 0
+    block = max(1, memory_budget // (8 * (matrix.nnz + n_articles)))
+    for start in range(0, len(a), block):
+        a_block, b_block = a[start:start + block, None], b[start:start + block, None]
+        hashes = (a_block * columns + b_block) % MINHASH_PRIME
+        block_signatures = np.minimum.reduceat(hashes[:, matrix.indices], starts, axis=1)
+        # reduceat does not leave empty rows empty
+        block_signatures[:, empty] = MINHASH_PRIME
+        signatures[start:start + block] = block_signatures
+    return signatures
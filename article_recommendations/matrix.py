@@ -0,0 +1,346 @@
+import weakref
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csc_matrix, csr_matrix
+
+from .instrument import timed
+
+
+# values derived from a user_item matrix by (id(user_item), name), see cached_for_matrix.
+# An entry is removed when its matrix is garbage collected
+_matrix_caches = {}
+
+
+class SparseUserItem:
+    '''
+    A user-item matrix stored as a scipy CSR matrix of 1's and 0's.
+
+    index - (pandas index) the user_id of each row
+    columns - (pandas index) the article_id of each column
+    matrix - (scipy csr matrix) users by articles
+
+    index and columns mirror the dense user_item dataframe, so the functions
+    below can look up rows and columns the same way for both backends.
+
+    version - (int) bumped whenever the matrix is changed in place, see
+              ingest.InteractionStore
+    '''
+    def __init__(self, matrix, index, columns):
+        self.matrix = matrix
+        self.index = index
+        self.columns = columns
+        self.version = 0
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def sum(self, axis=1):
+        '''
+        Number of interactions per user (axis=1) or per article (axis=0),
+        as a pandas series like DataFrame.sum would return
+        '''
+        totals = np.asarray(self.matrix.sum(axis=axis)).ravel()
+        return pd.Series(totals, index=self.index if axis == 1 else self.columns)
+
+    def head(self, n=5):
+        '''
+        Return the first n rows as a dense dataframe, for a quick look
+        '''
+        return pd.DataFrame(self.matrix[:n].toarray(), index=self.index[:n],
+                            columns=self.columns)
+
+    def to_dense(self):
+        '''
+        Return the equivalent dense user_item dataframe
+        '''
+        return pd.DataFrame(self.matrix.toarray(), index=self.index, columns=self.columns)
+
+
+@timed('matrix', size=lambda user_item: user_item.shape[0])
+def create_user_item_matrix(df, sparse=False):
+    '''
+    INPUT:
+    df - pandas dataframe with article_id, title, user_id columns
+    sparse - (bool) return a SparseUserItem instead of a dense dataframe
+
+    OUTPUT:
+    user_item - user item matrix
+
+    Description:
+    Return a matrix with user ids as rows and article ids on the columns with 1 values where a user interacted with
+    an article and a 0 otherwise
+    '''
+    if sparse:
+        return create_sparse_user_item_matrix(df)
+
+    df['interacted'] = 1
+    user_item = df.groupby(['user_id', 'article_id'])['interacted'].max().unstack()
+    user_item.fillna(0, inplace=True)
+    # Fill in the function here
+
+    return user_item
+
+
+def create_sparse_user_item_matrix(df):
+    '''
+    INPUT:
+    df - pandas dataframe with article_id, title, user_id columns
+
+    OUTPUT:
+    user_item - (SparseUserItem) user item matrix
+
+    Description:
+    Builds the CSR matrix straight from the user_id and article_id columns,
+    without the dense pivot. Rows and columns are sorted by id, the same
+    order create_user_item_matrix gives the dense dataframe.
+    '''
+    user_codes, user_ids = pd.factorize(df['user_id'], sort=True)
+    article_codes, article_ids = pd.factorize(df['article_id'], sort=True)
+    matrix = csr_matrix((np.ones(len(df)), (user_codes, article_codes)),
+                        shape=(len(user_ids), len(article_ids)))
+    # repeated interactions were summed up, a user either saw an article or not
+    matrix.data[:] = 1
+    return SparseUserItem(matrix,
+                          pd.Index(user_ids, name='user_id'),
+                          pd.Index(article_ids, name='article_id'))
+
+
+def user_item_values(user_item):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+
+    OUTPUT:
+    values - (numpy array) the matrix as a dense array
+    '''
+    if isinstance(user_item, SparseUserItem):
+        return user_item.matrix.toarray()
+    return user_item.values
+
+
+def user_item_values_at(user_item, rows):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    rows - (numpy array) row positions
+
+    OUTPUT:
+    values - (numpy array) len(rows) x n_articles, the selected rows as a dense array
+    '''
+    if isinstance(user_item, SparseUserItem):
+        return user_item.matrix[rows].toarray()
+    return user_item.values[rows]
+
+
+def user_item_data(user_item):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+
+    OUTPUT:
+    data - the matrix without densifying it, the csr matrix of a SparseUserItem
+           or the numpy array of a dataframe
+    '''
+    if isinstance(user_item, SparseUserItem):
+        return user_item.matrix
+    return user_item.values
+
+
+def user_similarities(user_item, user_id):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    user_id - (int) a user_id
+
+    OUTPUT:
+    similarities - (numpy array) dot product of every user with user_id,
+                   in the row order of user_item
+    '''
+    row = user_item.index.get_loc(user_id)
+    return user_similarity_block(user_item, [row])[0]
+
+
+def user_similarity_block(user_item, rows):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    rows - (array of ints) row positions of the query users in user_item
+
+    OUTPUT:
+    similarities - (numpy array) len(rows) x n_users dot products of the query
+                   users with every user, computed in one matrix product
+    '''
+    if isinstance(user_item, SparseUserItem):
+        matrix = user_item.matrix
+        return matrix[rows].dot(matrix.T).toarray()
+    values = user_item.values
+    return values[rows].dot(values.T)
+
+
+def cached_for_matrix(user_item, name, build):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    name - (str) what is cached
+    build - (function) computes the value from user_item
+
+    OUTPUT:
+    value - build(user_item), computed once per matrix and returned from the cache
+            afterwards, as long as the matrix keeps its shape and version
+    '''
+    cached = _matrix_caches.get((id(user_item), name))
+    if cached is not None:
+        matrix_ref, shape, version, value = cached
+        if (matrix_ref() is user_item and shape == user_item.shape
+                and version == matrix_version(user_item)):
+            return value
+    value = build(user_item)
+    set_cached_for_matrix(user_item, name, value)
+    return value
+
+
+def set_cached_for_matrix(user_item, name, value):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    name - (str) what is cached
+    value - the value cached_for_matrix should return for user_item, for callers
+            that can update it cheaper than building it again
+    '''
+    key = (id(user_item), name)
+    if key not in _matrix_caches:
+        # drops the entry with the matrix, before its id can be reused
+        weakref.finalize(user_item, _matrix_caches.pop, key, None)
+    _matrix_caches[key] = (weakref.ref(user_item), user_item.shape,
+                           matrix_version(user_item), value)
+
+
+def matrix_version(user_item):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+
+    OUTPUT:
+    version - (int) the version of a SparseUserItem, None for a dataframe
+    '''
+    if isinstance(user_item, SparseUserItem):
+        return user_item.version
+    return None
+
+
+def get_interaction_counts(user_item):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+
+    OUTPUT:
+    num_interactions - (numpy array) the number of articles seen by each user,
+                       in the row order of user_item, summed once per matrix
+    '''
+    return cached_for_matrix(user_item, 'num_interactions',
+                             lambda user_item: np.asarray(user_item.sum(axis=1)).ravel())
+
+
+def get_article_id_strings(user_item):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+
+    OUTPUT:
+    article_ids - (numpy array) the columns as strings like '1024.0', the form the
+                  recommenders return, converted once per matrix
+    '''
+    return cached_for_matrix(user_item, 'article_id_strings',
+                             lambda user_item: np.array([str(x) for x in user_item.columns],
+                                                        dtype=object))
+
+
+def get_user_item_csc(user_item):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+
+    OUTPUT:
+    csc - (scipy csc matrix) the matrix in column order, the users of every article
+          are csc.indices[csc.indptr[j]:csc.indptr[j + 1]]. Built once per matrix
+    '''
+    return cached_for_matrix(user_item, 'csc',
+                             lambda user_item: csc_matrix(user_item_data(user_item)))
+
+
+def user_rows(user_item, user_ids):
+    '''
+    INPUT:
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    user_ids - (int or list of ints) one or more user_ids
+
+    OUTPUT:
+    rows - (numpy array) the row position of every user_id in user_item,
+           raises a KeyError for unknown users
+    '''
+    user_ids = np.atleast_1d(user_ids)
+    rows = user_item.index.get_indexer(user_ids)
+    if (rows < 0).any():
+        raise KeyError(user_ids[rows < 0].tolist())
+    return rows
+
+
+def top_k_indices(scores, k):
+    '''
+    INPUT:
+    scores - (numpy array) 2d array, one row of scores per query
+    k - (int) the number of indices to keep per row
+
+    OUTPUT:
+    top_idx - (numpy array) len(scores) x k column indices of the largest scores
+              of each row, highest first. No columns if k is 0 or less
+
+    Description:
+    Selects with np.partition instead of sorting whole rows. Equal scores are
+    ordered by the lower column index first, so the result is deterministic
+    even where the k-th score is shared by more columns than fit.
+    '''
+    n_rows, n_cols = scores.shape
+    k = min(k, n_cols)
+    if k <= 0:
+        return np.empty((n_rows, 0), dtype=int)
+    if k < n_cols:
+        # the k-th largest score of every row
+        kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1:k]
+        above = scores > kth
+        ties = scores == kth
+        n_ties = k - above.sum(axis=1, keepdims=True)
+        keep = above | (ties & (np.cumsum(ties, axis=1) <= n_ties))
+        top_idx = np.nonzero(keep)[1].reshape(n_rows, k)
+    else:
+        top_idx = np.tile(np.arange(n_cols), (n_rows, 1))
+    # stable sort keeps the lower index first between equal scores
+    top_scores = np.take_along_axis(scores, top_idx, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top_idx, order, axis=1)
+
+
+def create_test_and_train_user_item(df_train, df_test, sparse=False):
+    '''
+    INPUT:
+    df_train - training dataframe
+    df_test - test dataframe
+    sparse - (bool) build both matrices as SparseUserItem
+
+    OUTPUT:
+    user_item_train - a user-item matrix of the training dataframe
+                      (unique users for each row and unique articles for each column)
+    user_item_test - a user-item matrix of the testing dataframe
+                    (unique users for each row and unique articles for each column)
+    test_idx - all of the test user ids
+    test_arts - all of the test article ids
+
+    '''
+    user_item_train = create_user_item_matrix(df_train, sparse=sparse)
+    user_item_test = create_user_item_matrix(df_test, sparse=sparse)
+    test_idx = set(df_test['user_id'].to_list())
+    test_arts = set(df_test['article_id'].to_list())
+
+    return user_item_train, user_item_test, test_idx, test_arts
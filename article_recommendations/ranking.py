@@ -0,0 +1,130 @@
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from .instrument import debug, timed
+
+
+# popularity tables by id(df), see get_popularity_table. An entry is removed when its
+# df is garbage collected
+_popularity_tables = {}
+
+
+def create_popularity_table(df):
+    '''
+    INPUT:
+    df - (pandas dataframe) interactions with article_id, title, user_id columns
+
+    OUTPUT:
+    popularity - (pandas dataframe) one row per article_id, ordered from the most
+                 to the least interactions, with columns:
+                    title - the article title
+                    count - the number of interactions with the article
+                    rank - (int) the row position, 0 for the most viewed article
+    '''
+    counts = df['article_id'].value_counts()
+    titles = df.drop_duplicates('article_id').set_index('article_id')['title']
+    popularity = pd.DataFrame({'title': titles.reindex(counts.index),
+                               'count': counts,
+                               'rank': np.arange(len(counts))})
+    popularity.index.name = 'article_id'
+    return popularity
+
+
+def get_popularity_table(df):
+    '''
+    INPUT:
+    df - (pandas dataframe) interactions with article_id, title, user_id columns
+
+    OUTPUT:
+    popularity - (pandas dataframe) see create_popularity_table
+
+    Description:
+    Returns the table built for this df before, as long as no rows were added to
+    or removed from it since, and builds it otherwise. Only the number of rows is
+    checked, so df must not be edited in place otherwise: changing article_id or
+    title values returns the old table. Edit a copy, or pass the new table to
+    set_popularity_table
+    '''
+    cached = _popularity_tables.get(id(df))
+    if cached is not None:
+        df_ref, n_rows, popularity = cached
+        if df_ref() is df and n_rows == df.shape[0]:
+            return popularity
+    popularity = create_popularity_table(df)
+    set_popularity_table(df, popularity)
+    return popularity
+
+
+def set_popularity_table(df, popularity):
+    '''
+    INPUT:
+    df - (pandas dataframe) interactions with article_id, title, user_id columns
+    popularity - (pandas dataframe) the table get_popularity_table should return for
+                 df, for callers that keep it up to date themselves
+    '''
+    if id(df) not in _popularity_tables:
+        # drops the entry with df, before its id can be reused
+        weakref.finalize(df, _popularity_tables.pop, id(df), None)
+    _popularity_tables[id(df)] = (weakref.ref(df), df.shape[0], popularity)
+
+
+def get_top_articles(n, df):
+    '''
+    INPUT:
+    n - (int) the number of top articles to return
+    df - (pandas dataframe) interactions with article_id, title, user_id columns
+
+    OUTPUT:
+    top_articles - (list) A list of the top 'n' article titles
+
+    '''
+    top_articles = list(get_popularity_table(df)['title'].values[:n])
+    return top_articles
+
+
+def get_top_article_ids(n, df):
+    '''
+    INPUT:
+    n - (int) the number of top articles to return
+    df - (pandas dataframe) interactions with article_id, title, user_id columns
+
+    OUTPUT:
+    top_articles - (pandas index) the top 'n' article ids
+
+    '''
+    top_articles = get_popularity_table(df).index[:n]
+
+    return top_articles
+
+
+def get_article_ranks(article_ids, df):
+    '''
+    INPUT:
+    article_ids - (list) a list of article ids
+    df - (pandas dataframe) interactions with article_id, title, user_id columns
+
+    OUTPUT:
+    ranks - (numpy array) position of each article in get_top_article_ids,
+            0 for the article with the most interactions
+    '''
+    return get_popularity_table(df)['rank'].reindex(article_ids).values
+
+
+@timed('candidates')
+def add_ordered(recs, cur_recs, m, df):
+    '''
+    Adds the articles of cur_recs to recs, most popular first, until recs holds m articles
+    '''
+    cur_recs = list(cur_recs)
+    recs = list(recs)
+    debug('add_ordered', n_recs=len(recs), n_candidates=len(cur_recs), m=m)
+    ranks = get_article_ranks([float(x) for x in cur_recs], df)
+    sorted_articles = [cur_recs[i] for i in np.argsort(ranks, kind='stable')]
+    for rec in sorted_articles:
+        recs.append(rec)
+        if len(recs) == m:
+            debug('add_ordered.full', n_recs=len(recs))
+            break
+    return set(recs)
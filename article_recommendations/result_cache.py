@@ -0,0 +1,190 @@
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# returned by ResultCache.get for keys without a valid result, results may be None
+MISSING = object()
+
+
+class ResultCache:
+    '''
+    A bounded cache of recommender results with least recently used eviction and an
+    optional time to live.
+
+    maxsize - (int) the number of results kept, the least recently used one is
+              evicted to make room
+    ttl - (float) seconds a result stays valid, forever if None
+    hits, misses, evictions, expirations - (int) counters, see stats
+
+    Results are cached by the function, its arguments and a data version, so a new
+    version (e.g. InteractionStore.version after an append) misses every result
+    computed before it. Cached results are returned as they are, callers must not
+    change them.
+
+    The cache can be shared by threads. Results are computed outside its lock, so
+    threads missing the same key at once each compute it.
+    '''
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        '''
+        INPUT:
+        key - (hashable) identifies the result
+
+        OUTPUT:
+        result - the cached result of key, MISSING if there is none or it expired
+        '''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                result, expires = entry
+                if expires is None or self.clock() < expires:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return MISSING
+
+    def put(self, key, result):
+        '''
+        INPUT:
+        key - (hashable) identifies the result
+        result - cached for key, evicting the least recently used results if full
+        '''
+        with self.lock:
+            self.entries[key] = (result, None if self.ttl is None else self.clock() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        '''
+        INPUT:
+        key - (hashable) identifies the result
+        compute - (function) called without arguments to produce the result on a miss
+
+        OUTPUT:
+        result - the cached result of key, or the result of compute
+        '''
+        result = self.get(key)
+        if result is MISSING:
+            result = compute()
+            self.put(key, result)
+        return result
+
+    def wrap(self, function, version=lambda: None):
+        '''
+        INPUT:
+        function - (function) a recommender, e.g. RecommendationData.user_user_recs_part2
+        version - (function) returns the current data version, called on every lookup
+
+        OUTPUT:
+        cached_function - (function) function with its results cached here
+
+        Description:
+        The arguments are bound to the signature of function with the defaults
+        filled in, so f(1), f(1, 10) and f(user_id=1, m=10) share a result
+        '''
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def cached_function(*args, **kwargs):
+            # bound methods of different objects are different keys
+            key = (function, version(), call_key(signature, args, kwargs))
+            return self.get_or_compute(key, lambda: function(*args, **kwargs))
+        return cached_function
+
+    def clear(self):
+        '''
+        Drops every cached result, the counters are kept
+        '''
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        '''
+        OUTPUT:
+        stats - (dict) the counters, the number of cached results and the hit rate
+        '''
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'expirations': self.expirations, 'size': len(self.entries),
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+def call_key(signature, args, kwargs):
+    '''
+    INPUT:
+    signature - (inspect.Signature) of the called function
+    args, kwargs - the arguments of the call
+
+    OUTPUT:
+    key - the arguments by parameter name with the defaults applied, see freeze.
+          Raises TypeError like the call would if they do not fit the signature
+    '''
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    key = []
+    for name, value in bound.arguments.items():
+        if signature.parameters[name].kind is inspect.Parameter.VAR_KEYWORD:
+            value = tuple(sorted(value.items()))
+        key.append((name, freeze(value)))
+    return tuple(key)
+
+
+def freeze(value):
+    '''
+    INPUT:
+    value - a function argument
+
+    OUTPUT:
+    key - value as a hashable key. Lists, tuples, numpy arrays and pandas indexes
+          become tuples, data like a df, a user_item matrix or a dict is identified by
+          the object (see IdentityKey), its changes are covered by the version
+    '''
+    if isinstance(value, (np.ndarray, pd.Index)):
+        return tuple(value.tolist())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        return IdentityKey(value)
+    return value
+
+
+class IdentityKey:
+    '''
+    A key equal only to keys of the same object. Holds a reference to the object, so
+    its id is not reused by another object while the key is cached
+    '''
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return id(self.value)
+
+    def __eq__(self, other):
+        return isinstance(other, IdentityKey) and other.value is self.value
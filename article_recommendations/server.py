@@ -0,0 +1,535 @@
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from .collaborative import batch_user_user_recs_part2, get_article_names
+from .data import INTERACTIONS_PATH, RecommendationData
+from .evaluation import top_unseen
+from . import instrument
+from .factorization import SVDModel
+from .matrix import user_rows
+from .ranking import get_popularity_table, get_top_article_ids
+from .result_cache import MISSING, ResultCache
+
+
+class ServingModel:
+    '''
+    The data the server recommends from. Never changed once built, a reload builds
+    a new one and swaps it in, requests already batched finish on the old one.
+
+    df - (pandas dataframe) interactions, ranks the articles by popularity
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+    article_titles - (dict) article_id -> title, see create_article_titles
+    svd_model - (SVDModel) fit on user_item, or None to serve no svd recommendations
+    result_cache - (ResultCache) keeps the recommendations of every user and m, or
+                   None to compute every request. As the model never changes, the
+                   results stay valid for its lifetime and a reload starts a new cache
+    '''
+    def __init__(self, df, user_item, article_titles, svd_model=None, result_cache=None):
+        if svd_model is not None and not svd_model.columns.equals(user_item.columns):
+            raise ValueError('svd_model must have the articles of user_item as columns')
+        self.df = df
+        self.user_item = user_item
+        self.article_titles = article_titles
+        self.svd_model = svd_model
+        self.result_cache = result_cache
+        self.version = None
+        # built once here instead of on the first request
+        get_popularity_table(df)
+
+    @classmethod
+    def from_data(cls, data, svd_k=None, svd_path=None, cache_size=0):
+        '''
+        INPUT:
+        data - (RecommendationData) the interactions, best with sparse=True
+        svd_k - (int) fit an SVDModel with svd_k latent features
+        svd_path - (str) load the SVDModel saved there instead, see SVDModel.save
+        cache_size - (int) the number of results a ResultCache keeps, 0 for no cache
+
+        OUTPUT:
+        model - (ServingModel) the structures of data, without svd if neither is given
+        '''
+        svd_model = None
+        if svd_path is not None:
+            svd_model = SVDModel.load(svd_path)
+        elif svd_k is not None:
+            svd_model = SVDModel.fit(data.user_item, k=svd_k, method='truncated')
+        result_cache = ResultCache(cache_size) if cache_size else None
+        return cls(data.df, data.user_item, data.article_titles, svd_model, result_cache)
+
+    def has_user(self, recommender, user_id):
+        '''
+        OUTPUT:
+        known - (bool) recommender can score user_id
+        '''
+        if recommender == 'svd':
+            # svd_recs masks the articles the user has seen in user_item
+            return (self.svd_model is not None and user_id in self.svd_model.index
+                    and user_id in self.user_item.index)
+        return user_id in self.user_item.index
+
+    def with_names(self, recs):
+        '''
+        OUTPUT:
+        results - (list of dicts) article_ids and titles of every list of recs
+        '''
+        return [{'article_ids': ids, 'titles': get_article_names(ids, self.article_titles)}
+                for ids in recs]
+
+    def cached_batch(self, recommender, compute, user_ids, m):
+        '''
+        INPUT:
+        recommender - (str) the name of compute in the cache keys
+        compute - (function) takes user_ids and m, returns the result of every user
+        user_ids, m - the batch
+
+        OUTPUT:
+        results - the result of every user, compute is only called, once, for the
+                  users result_cache has no result for
+        '''
+        if self.result_cache is None:
+            return compute(user_ids, m)
+        keys = [(recommender, user_id, m) for user_id in user_ids]
+        results = [self.result_cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is MISSING]
+        if missing:
+            for i, result in zip(missing, compute([user_ids[i] for i in missing], m)):
+                self.result_cache.put(keys[i], result)
+                results[i] = result
+        return results
+
+    def user_user_recs(self, user_ids, m):
+        '''
+        user_user_recs_part2 of every user, in one batch
+        '''
+        return self.cached_batch('user_user', self.compute_user_user_recs, user_ids, m)
+
+    def compute_user_user_recs(self, user_ids, m):
+        '''
+        user_user_recs without the cache
+        '''
+        recs = batch_user_user_recs_part2(user_ids, m, df=self.df, user_item=self.user_item)
+        return self.with_names([[rec for rec in row if rec is not None] for row in recs])
+
+    def svd_recs(self, user_ids, m):
+        '''
+        The unseen articles with the highest reconstructed interaction, in one batch
+        '''
+        return self.cached_batch('svd', self.compute_svd_recs, user_ids, m)
+
+    def compute_svd_recs(self, user_ids, m):
+        '''
+        svd_recs without the cache
+        '''
+        recs = top_unseen(self.svd_model.predict(user_ids), self.user_item,
+                          user_rows(self.user_item, user_ids), m)
+        return self.with_names(recs)
+
+    def popular_recs(self, m):
+        '''
+        The m most popular articles
+        '''
+        def compute():
+            return self.with_names([[str(x) for x in get_top_article_ids(m, self.df)]])[0]
+        if self.result_cache is None:
+            return compute()
+        return self.result_cache.get_or_compute(('popular', m), compute)
+
+
+def run_grouped(method, items):
+    '''
+    INPUT:
+    method - (str) the ServingModel method computing a batch, user_user_recs or svd_recs
+    items - (list of tuples) model, user_id, m of every request of the batch
+
+    OUTPUT:
+    results - (list) the result of every request
+
+    Description:
+    Requests on the same model with the same m are computed together, a batch
+    only holds more groups around a reload or if clients ask for different m. The
+    error of a group is the result of its requests only, see MicroBatcher
+    '''
+    groups = {}
+    for position, (model, user_id, m) in enumerate(items):
+        groups.setdefault((model, m), []).append(position)
+    results = [None] * len(items)
+    for (model, m), positions in groups.items():
+        try:
+            recs = getattr(model, method)([items[position][1] for position in positions], m)
+        except Exception as error:
+            recs = [error] * len(positions)
+        for position, rec in zip(positions, recs):
+            results[position] = rec
+    return results
+
+
+class Overloaded(Exception):
+    '''
+    Raised when a MicroBatcher has max_pending requests waiting already
+    '''
+
+
+class MicroBatcher:
+    '''
+    Coalesces concurrent requests into batches computed by one call in an executor.
+
+    function - (function) takes the list of items of a batch, returns their results.
+               An exception as the result of an item is raised by its future only,
+               one raised by function by the futures of the whole batch
+    max_batch_size - (int) a batch is started as soon as it has this many items
+    max_delay - (float) seconds the first item of a batch waits for more
+    max_pending - (int) items waiting or being computed before submit refuses more
+    executor - (Executor) runs function off the event loop
+    batches, items, rejected - (int) counters, see stats
+    '''
+    def __init__(self, function, max_batch_size=64, max_delay=0.002, max_pending=1024,
+                 executor=None):
+        self.function = function
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.executor = executor
+        self.pending = []
+        self.n_in_flight = 0
+        self.timer = None
+        self.tasks = set()
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+
+    def submit(self, item):
+        '''
+        INPUT:
+        item - an argument for function
+
+        OUTPUT:
+        future - (asyncio future) resolves to the result of item
+        '''
+        if len(self.pending) + self.n_in_flight >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((item, future))
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_delay, self.flush)
+        return future
+
+    def flush(self):
+        '''
+        Starts computing the pending items as one batch
+        '''
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        self.n_in_flight += len(batch)
+        task = asyncio.get_running_loop().create_task(self.run(batch))
+        # the loop only keeps weak references to tasks
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.function,
+                                                 [item for item, _ in batch])
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        else:
+            for (_, future), result in zip(batch, results):
+                # the client may have gone away in the meantime
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self.n_in_flight -= len(batch)
+            self.batches += 1
+            self.items += len(batch)
+
+    def stats(self):
+        '''
+        OUTPUT:
+        stats - (dict) the counters, the mean batch size and the items waiting or
+                being computed
+        '''
+        return {'batches': self.batches, 'items': self.items, 'rejected': self.rejected,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+                'pending': len(self.pending) + self.n_in_flight}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 431: 'Request Header Fields Too Large',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+# no endpoint reads a body, requests with larger ones or more headers than this are
+# refused and their connection closed
+MAX_BODY_SIZE = 2 ** 16
+MAX_HEADERS = 100
+
+
+async def read_headers(reader):
+    '''
+    INPUT:
+    reader - (asyncio.StreamReader) positioned after the request line
+
+    OUTPUT:
+    headers - (dict) lower case header name -> value
+
+    Description:
+    Reads the headers and skips the body. Raises HTTPError 431 for more than
+    MAX_HEADERS headers and 413 for a body larger than MAX_BODY_SIZE, without
+    reading the rest of the request
+    '''
+    headers = {}
+    for n_lines in itertools.count():
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if n_lines == MAX_HEADERS:
+            raise HTTPError(431, 'at most {} headers are allowed'.format(MAX_HEADERS))
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length < 0:
+        raise ValueError('negative Content-Length')
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, 'the body may have at most {} bytes'.format(MAX_BODY_SIZE))
+    if length:
+        await reader.readexactly(length)
+    return headers
+
+
+class RecommendationServer:
+    '''
+    A JSON over HTTP service for the user-user, popularity and svd recommendations.
+
+    loader - (function) builds the ServingModel, called at start and on every reload
+    max_batch_size, max_delay, max_pending - see MicroBatcher, per recommender
+    n_threads - (int) the threads computing batches
+    max_m - (int) the most recommendations a request may ask for, larger m are
+            refused with 400. m is also capped at the number of articles
+
+    GET /recommendations/user_user?user_id=20&m=10
+    GET /recommendations/svd?user_id=20&m=10
+    GET /recommendations/popular?m=10
+        {"article_ids": [...], "titles": [...]}, 404 for users the recommender does
+        not know, 503 if too many requests are pending
+    GET /stats
+        the model version, the counters of the batchers and of the result cache and
+        the stage timings, see instrument.snapshot
+    POST /reload
+        calls loader in a thread and swaps the new model in once it is built
+
+    Requests with more than MAX_HEADERS headers or a body over MAX_BODY_SIZE bytes
+    get 431 or 413 and their connection is closed
+    '''
+    def __init__(self, loader, max_batch_size=64, max_delay=0.002, max_pending=1024,
+                 n_threads=1, max_m=100):
+        self.loader = loader
+        self.max_m = max_m
+        self.model = None
+        self.version = 0
+        self.executor = ThreadPoolExecutor(n_threads)
+        self.batchers = {
+            name: MicroBatcher(functools.partial(run_grouped, method), max_batch_size,
+                               max_delay, max_pending, self.executor)
+            for name, method in [('user_user', 'user_user_recs'), ('svd', 'svd_recs')]}
+        self.reload_lock = None
+
+    async def reload(self):
+        '''
+        Builds a new model with loader and makes it the one new requests use
+        '''
+        if self.reload_lock is None:
+            self.reload_lock = asyncio.Lock()
+        async with self.reload_lock:
+            model = await asyncio.get_running_loop().run_in_executor(None, self.loader)
+            self.version += 1
+            model.version = self.version
+            self.model = model
+
+    async def recommend(self, recommender, user_id, m):
+        '''
+        OUTPUT:
+        result - (dict) article_ids and titles of the recommendations
+        '''
+        model = self.model
+        m = min(m, model.user_item.shape[1])
+        if recommender == 'popular':
+            return model.popular_recs(m)
+        if recommender not in self.batchers:
+            raise HTTPError(404, 'unknown recommender {}'.format(recommender))
+        if user_id is None:
+            raise HTTPError(400, 'user_id is required')
+        if not model.has_user(recommender, user_id):
+            raise HTTPError(404, 'unknown user {}'.format(user_id))
+        try:
+            future = self.batchers[recommender].submit((model, user_id, m))
+        except Overloaded:
+            raise HTTPError(503, 'too many pending requests')
+        return await future
+
+    def stats(self):
+        '''
+        OUTPUT:
+        stats - (dict) the model version, the stats of every batcher, the stats of the
+                model's ResultCache, None without one, and the stage timings, empty
+                unless instrument is enabled
+        '''
+        result_cache = None if self.model is None else self.model.result_cache
+        return {'version': self.version,
+                'batchers': {name: batcher.stats() for name, batcher in self.batchers.items()},
+                'result_cache': None if result_cache is None else result_cache.stats(),
+                'stages': instrument.snapshot()}
+
+    async def respond(self, method, target):
+        '''
+        OUTPUT:
+        status - (int) the HTTP status
+        body - the JSON body
+        '''
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        if parts == ['reload']:
+            if method != 'POST':
+                raise HTTPError(405, 'use POST')
+            await self.reload()
+            return 200, {'version': self.version}
+        if method != 'GET':
+            raise HTTPError(405, 'use GET')
+        if parts == ['stats']:
+            return 200, self.stats()
+        if len(parts) == 2 and parts[0] == 'recommendations':
+            try:
+                m = int(query.get('m', 10))
+                user_id = int(query['user_id']) if 'user_id' in query else None
+            except ValueError:
+                raise HTTPError(400, 'user_id and m must be integers')
+            if m < 1:
+                raise HTTPError(400, 'm must be positive')
+            if m > self.max_m:
+                raise HTTPError(400, 'm must be at most {}'.format(self.max_m))
+            return 200, await self.recommend(parts[1], user_id, m)
+        raise HTTPError(404, 'unknown path {}'.format(url.path))
+
+    async def reply(self, writer, status, body, keep_alive):
+        '''
+        Writes one JSON response
+        '''
+        payload = json.dumps(body).encode()
+        writer.write('HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n'
+                     'Content-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+                         status, REASONS[status], len(payload),
+                         'keep-alive' if keep_alive else 'close').encode() + payload)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        '''
+        Serves the requests of one connection, keeping it open between HTTP/1.1
+        requests unless the client asks to close it
+        '''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    headers = await read_headers(reader)
+                except HTTPError as error:
+                    # the rest of the request is unread, the connection cannot be reused
+                    await self.reply(writer, error.status, {'error': error.message}, False)
+                    break
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    keep_alive = keep_alive and version == 'HTTP/1.1'
+                    status, body = await self.respond(method, target)
+                except HTTPError as error:
+                    status, body = error.status, {'error': error.message}
+                except ValueError:
+                    status, body, keep_alive = 400, {'error': 'malformed request'}, False
+                except Exception as error:
+                    status, body = 500, {'error': repr(error)}
+
+                await self.reply(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8000):
+        '''
+        OUTPUT:
+        server - (asyncio Server) listening, after the first model was loaded
+        '''
+        await self.reload()
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def serve_forever(self, host='127.0.0.1', port=8000):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    '''
+    Serves the recommendations of the interactions csv, e.g.
+    python -m article_recommendations.server --port 8000 --svd-k 100
+    '''
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--interactions', default=INTERACTIONS_PATH)
+    parser.add_argument('--emails', help='the email to user_id mapping, see EmailEncoder')
+    parser.add_argument('--svd-k', type=int, help='fit an svd with this many latent features')
+    parser.add_argument('--svd-model', help='load the svd saved there, see SVDModel.save')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-delay', type=float, default=0.002)
+    parser.add_argument('--max-pending', type=int, default=1024)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--max-m', type=int, default=100)
+    parser.add_argument('--cache-size', type=int, default=0,
+                        help='cache this many results per model, see ResultCache')
+    parser.add_argument('--instrument', action='store_true',
+                        help='time the stages of every request, see GET /stats')
+    args = parser.parse_args(argv)
+
+    if args.instrument:
+        instrument.enable()
+
+    def loader():
+        data = RecommendationData(args.interactions, sparse=True, emails_path=args.emails)
+        return ServingModel.from_data(data, svd_k=args.svd_k, svd_path=args.svd_model,
+                                      cache_size=args.cache_size)
+
+    server = RecommendationServer(loader, args.max_batch_size, args.max_delay,
+                                  args.max_pending, args.threads, args.max_m)
+    asyncio.run(server.serve_forever(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
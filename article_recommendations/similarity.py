@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+from .instrument import timed
+from .matrix import get_interaction_counts, top_k_indices, user_rows, user_similarity_block
+
+
+def top_similar_users(user_ids, user_item, k=None):
+    '''
+    INPUT:
+    user_ids - (int or list of ints) one or more user_ids
+    k - (int) the number of neighbors to return for each user, all other users if None
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles:
+                1's when a user has interacted with an article, 0 otherwise
+
+    OUTPUT:
+    neighbors - (numpy array) len(user_ids) x k user_ids of the most similar users,
+                closest first, never containing the query user itself
+    similarities - (numpy array) the dot products belonging to neighbors
+
+    Description:
+    Scores all query users against every user in one matrix product and keeps
+    only the top k of each row. Users with the same similarity are ordered by
+    user_id.
+    '''
+    top_idx, similarities = top_similar_rows(user_rows(user_item, user_ids), k, user_item)
+    neighbors = np.asarray(user_item.index)[top_idx]
+    return neighbors, similarities
+
+
+@timed('similarity', size=lambda result: result[0].size)
+def top_similar_rows(rows, k, user_item):
+    '''
+    INPUT:
+    rows - (numpy array) row positions of the query users
+    k - (int) the number of neighbors per query user, all other users if None
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+
+    OUTPUT:
+    top_idx - (numpy array) len(rows) x k row positions of the closest users
+    similarities - (numpy array) the dot products belonging to top_idx
+
+    Description:
+    The row based core of top_similar_users
+    '''
+    sims = user_similarity_block(user_item, rows).astype(float)
+    # every user is most similar to him/herself, leave the query user out
+    sims[np.arange(len(rows)), rows] = -np.inf
+    n_neighbors = user_item.shape[0] - 1
+    k = n_neighbors if k is None else min(k, n_neighbors)
+
+    top_idx = top_k_indices(sims, k)
+    return top_idx, np.take_along_axis(sims, top_idx, axis=1)
+
+
+def find_similar_users(user_id, user_item, k=None):
+    '''
+    INPUT:
+    user_id - (int) a user_id
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles:
+                1's when a user has interacted with an article, 0 otherwise
+    k - (int) only return the k closest users, all users if None
+
+    OUTPUT:
+    similar_users - (list) an ordered list where the closest users (largest dot product users)
+                    are listed first
+
+    Description:
+    Computes the similarity of every pair of users based on the dot product
+    Returns an ordered list, users with the same similarity are ordered by user_id
+
+    '''
+    neighbors, _ = top_similar_users(user_id, user_item, k=k)
+
+    return neighbors[0].tolist()
+
+
+def rank_neighbors(user_id, user_item, k=None):
+    '''
+    INPUT:
+    user_id - (int)
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles:
+            1's when a user has interacted with an article, 0 otherwise
+    k - (int) only return the k best neighbors, all other users if None
+
+    OUTPUT:
+    neighbor_ids - (numpy array) the other users, best neighbor first
+    similarity - (numpy array) dot product of each neighbor with user_id
+    num_interactions - (numpy array) the number of articles seen by each neighbor
+
+    Description:
+    Orders the neighbors by similarity, then by number of interactions, then by
+    user_id. Needs one matrix-vector product, the interaction counts are computed
+    once per matrix (get_interaction_counts). With k only the users at least as
+    similar as the k-th most similar one get sorted.
+    '''
+    order, similarity, num_interactions = rank_neighbor_rows(user_rows(user_item, user_id),
+                                                             k, user_item)
+    return np.asarray(user_item.index)[order[0]], similarity[0], num_interactions[0]
+
+
+@timed('similarity', size=lambda result: result[0].size)
+def rank_neighbor_rows(rows, k, user_item):
+    '''
+    INPUT:
+    rows - (numpy array) row positions of the query users
+    k - (int) the number of neighbors per query user, all other users if None
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles
+
+    OUTPUT:
+    order - (numpy array) len(rows) x k row positions of the neighbors, best first
+    similarity - (numpy array) the dot products belonging to order
+    num_interactions - (numpy array) the interaction counts belonging to order
+
+    Description:
+    The row based core of rank_neighbors, one matrix product for all query users
+    '''
+    similarities = user_similarity_block(user_item, rows).astype(float)
+    similarities[np.arange(len(rows)), rows] = -np.inf
+    num_interactions = get_interaction_counts(user_item)
+    n_neighbors = user_item.shape[0] - 1
+    k = n_neighbors if k is None else min(k, n_neighbors)
+
+    order = np.empty((len(rows), k), dtype=int)
+    for i, similarity in enumerate(similarities):
+        if k < n_neighbors:
+            kth = -np.partition(-similarity, k - 1)[k - 1]
+            candidates = np.flatnonzero(similarity >= kth)
+        else:
+            candidates = np.flatnonzero(similarity > -np.inf)
+        # lexsort sorts by the last key first and keeps user_id order between full ties
+        ranked = np.lexsort((-num_interactions[candidates], -similarity[candidates]))
+        order[i] = candidates[ranked][:k]
+    return (order, np.take_along_axis(similarities, order, axis=1),
+            num_interactions[order])
+
+
+def get_top_sorted_users(user_id, user_item, k=None):
+    '''
+    INPUT:
+    user_id - (int)
+    user_item - (pandas dataframe or SparseUserItem) matrix of users by articles:
+            1's when a user has interacted with an article, 0 otherwise
+    k - (int) only return the k best neighbors, all other users if None
+
+
+    OUTPUT:
+    neighbors_df - (pandas dataframe) a dataframe with:
+                    neighbor_id - is a neighbor user_id
+                    similarity - measure of the similarity of each user to the provided user_id
+                    num_interactions - the number of articles viewed by the user - if a u
+
+    Other Details - sort the neighbors_df by the similarity and then by number of interactions where
+                    highest of each is higher in the dataframe, see rank_neighbors
+
+    '''
+    neighbor_ids, similarity, num_interactions = rank_neighbors(user_id, user_item, k=k)
+    neighbors_df = pd.DataFrame({'neighbor_id': neighbor_ids,
+                                 'similarity': similarity,
+                                 'num_interactions': num_interactions})
+    return neighbors_df
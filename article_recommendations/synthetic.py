@@ -0,0 +1,289 @@
+import argparse
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# the shipped data: 45993 interactions of 5149 users with 714 articles, 1051 articles
+# in the content file
+N_INTERACTIONS = 45993
+N_USERS = 5149
+N_ARTICLES = 714
+N_CONTENT_ARTICLES = 1051
+
+# user activity 1 + floor(SCALE * X) capped at MAX_USER_INTERACTIONS, X Lomax distributed
+# with shape USER_ACTIVITY_SHAPE. Fitted to the median of 3, the mean of 8.9 and the
+# maximum of 364 interactions per user
+USER_ACTIVITY_SHAPE = 1.4
+USER_ACTIVITY_SCALE = 4.0
+MAX_USER_INTERACTIONS = 364
+# article popularity rank ** -ARTICLE_POPULARITY_EXPONENT, fitted to the 937 views of the
+# most viewed of the 714 articles
+ARTICLE_POPULARITY_EXPONENT = 0.512
+
+DUPLICATE_ARTICLE_SHARE = 5 / 1051
+NULL_BODY_SHARE = 14 / 1056
+NULL_DESCRIPTION_SHARE = 3 / 1056
+
+SYLLABLES = ['ba', 'co', 'da', 'de', 'fi', 'ga', 'ho', 'ka', 'la', 'li', 'ma', 'mo', 'na',
+             'ne', 'pa', 'po', 'ra', 're', 'sa', 'si', 'ta', 'to', 'va', 'xe', 'zo',
+             'an', 'er', 'in', 'on', 'us', 'al', 'ex', 'or', 'um', 'is', 'en']
+
+
+def activity_counts(n_interactions, n_users, rng):
+    '''
+    INPUT:
+    n_interactions - (int) the total number of interactions, from n_users to
+                     n_users * MAX_USER_INTERACTIONS
+    n_users - (int) the number of users
+    rng - (numpy Generator)
+
+    OUTPUT:
+    counts - (numpy array) the number of interactions of every user, from 1 to
+             MAX_USER_INTERACTIONS and summing up to n_interactions
+
+    Description:
+    Draws power law activities (see USER_ACTIVITY_SHAPE) and scales what every user
+    has on top of one interaction to the total. Users scaled past the cap are set
+    to it and the rest are scaled up again to make up for it, until nobody is over.
+    The rounding remainders go to the users below the cap with the largest fractions
+    '''
+    if not n_users <= n_interactions <= n_users * MAX_USER_INTERACTIONS:
+        raise ValueError('every user needs an interaction and at most {}, n_interactions '
+                         'must be from n_users to n_users * {}'.format(
+                             MAX_USER_INTERACTIONS, MAX_USER_INTERACTIONS))
+    activity = np.floor(USER_ACTIVITY_SCALE * rng.pareto(USER_ACTIVITY_SHAPE, n_users))
+    extra = n_interactions - n_users
+    cap = MAX_USER_INTERACTIONS - 1
+    capped = np.zeros(n_users, dtype=bool)
+    while True:
+        free = activity * ~capped
+        if free.sum() == 0:
+            free = (~capped).astype(float)
+        share = np.where(capped, cap, free * ((extra - cap * capped.sum()) / free.sum()))
+        over = share > cap
+        if not over.any():
+            break
+        capped |= over
+    counts = np.floor(share).astype(np.int64)
+    remainder = extra - counts.sum()
+    if remainder:
+        fractions = np.where(counts < cap, counts - share, np.inf)
+        counts[np.argpartition(fractions, remainder - 1)[:remainder]] += 1
+    return counts + 1
+
+
+def popularity_weights(n_articles, rng):
+    '''
+    OUTPUT:
+    weights - (numpy array) the probability of each article to be viewed, power law
+              in the popularity rank (see ARTICLE_POPULARITY_EXPONENT), the ranks in
+              random order
+    '''
+    weights = np.arange(1, n_articles + 1) ** -ARTICLE_POPULARITY_EXPONENT
+    return rng.permutation(weights / weights.sum())
+
+
+def make_vocabulary(n_words, rng):
+    '''
+    OUTPUT:
+    vocabulary - (numpy array) n_words distinct lower case words of 2 to 4 syllables,
+                 the most frequent first, see random_texts
+    '''
+    syllables = np.array(SYLLABLES, dtype=object)
+    words = pd.unique(np.concatenate([
+        syllables[rng.integers(0, len(syllables), (n_words * 2, n))].sum(axis=1)
+        for n in (2, 3, 4)]))
+    return np.array(rng.permutation(words)[:n_words], dtype=object)
+
+
+def random_texts(lengths, vocabulary, rng):
+    '''
+    INPUT:
+    lengths - (numpy array) the number of words of each text
+    vocabulary - (numpy array) the words, drawn with Zipf frequencies by position
+    rng - (numpy Generator)
+
+    OUTPUT:
+    texts - (list of str) one text of space separated words per length
+    '''
+    frequency = np.cumsum(1 / np.arange(1, len(vocabulary) + 1))
+    draws = rng.random(lengths.sum()) * frequency[-1]
+    words = vocabulary[np.searchsorted(frequency, draws, side='right')]
+    return [' '.join(text) for text in np.split(words, np.cumsum(lengths)[:-1])]
+
+
+def user_emails(users, seed):
+    '''
+    OUTPUT:
+    emails - (list of str) a sha1 hex digest per user like the hashed emails of the
+             shipped data, the same for the same user and seed
+    '''
+    return [hashlib.sha1('{}:{}'.format(seed, user).encode()).hexdigest() for user in users]
+
+
+class SyntheticData:
+    '''
+    Interaction and content files with the schemas of the shipped data at any size.
+
+    n_interactions, n_users, n_articles - (int) the size of the interaction log. Every
+                                          user has an interaction, the articles are
+                                          drawn by popularity, so with few
+                                          interactions some may have none. Like in the
+                                          shipped data one of the users stands for the
+                                          interactions without an email
+    n_content_articles - (int) the number of distinct articles in the content file.
+                         Like in the shipped data only part of the viewed articles
+                         have content, and many content articles no views
+    seed - (int) the same seed and sizes give the same files
+    body_words - (int) the median number of words of a doc_body
+    chunk_size - (int) the number of interactions generated and written at a time
+    content_chunk_size - (int) the same for the content rows, which are much longer
+
+    The per-user and per-article arrays are kept in memory, rows are generated chunk
+    by chunk, so memory does not grow with the number of interactions.
+    '''
+    def __init__(self, n_interactions=N_INTERACTIONS, n_users=N_USERS, n_articles=N_ARTICLES,
+                 n_content_articles=N_CONTENT_ARTICLES, seed=0, body_words=300,
+                 chunk_size=10 ** 6, content_chunk_size=10 ** 4):
+        self.n_interactions = n_interactions
+        self.n_users = n_users
+        self.n_articles = n_articles
+        self.n_content_articles = n_content_articles
+        self.seed = seed
+        self.body_words = body_words
+        self.chunk_size = chunk_size
+        self.content_chunk_size = content_chunk_size
+
+        # independent streams, so e.g. the content does not change with n_interactions
+        seeds = np.random.SeedSequence(seed).spawn(5)
+        users_rng, articles_rng, names_rng = [np.random.default_rng(s) for s in seeds[:3]]
+        self.interactions_seed, self.content_seed = seeds[3:]
+        self.counts = activity_counts(n_interactions, n_users, users_rng)
+        self.vocabulary = make_vocabulary(20000, names_rng)
+
+        # content articles are 0 .. n_content_articles - 1, the viewed ones are drawn
+        # from a range reaching half of n_articles past them
+        n_ids = max(n_content_articles, n_articles) + n_articles // 2
+        self.article_ids = np.sort(articles_rng.choice(n_ids, n_articles, replace=False))
+        self.weights = popularity_weights(n_articles, articles_rng)
+        self.names = np.array(random_texts(2 + names_rng.poisson(4, n_ids), self.vocabulary,
+                                           names_rng), dtype=object)
+
+    def interaction_chunks(self):
+        '''
+        OUTPUT:
+        chunks - (generator of pandas dataframes) the interactions with article_id
+                 (float), title and email columns, about chunk_size rows each and
+                 indexed by row number over all chunks. The users of a chunk are
+                 interleaved. The last user has a null email, see map_emails
+        '''
+        rng = np.random.default_rng(self.interactions_seed)
+        cumulative = np.cumsum(self.weights)
+        ends = np.cumsum(self.counts)
+        bounds = np.unique(np.concatenate([
+            np.searchsorted(ends, np.arange(self.chunk_size, ends[-1], self.chunk_size)),
+            [self.n_users]]))
+        bounds = bounds[bounds > 0]
+        start_user = 0
+        start_row = 0
+        for end_user in bounds:
+            users = np.arange(start_user, end_user)
+            rows = np.repeat(np.arange(len(users)), self.counts[start_user:end_user])
+            rows = rng.permutation(rows)
+            emails = np.array(user_emails(users, self.seed), dtype=object)
+            emails[users == self.n_users - 1] = None
+            emails = emails[rows]
+            articles = np.minimum(np.searchsorted(cumulative, rng.random(len(rows))),
+                                  self.n_articles - 1)
+            article_ids = self.article_ids[articles]
+            yield pd.DataFrame({'article_id': article_ids.astype(float),
+                                'title': self.names[article_ids],
+                                'email': emails},
+                               index=pd.RangeIndex(start_row, start_row + len(rows)))
+            start_user = end_user
+            start_row += len(rows)
+
+    def content_chunks(self):
+        '''
+        OUTPUT:
+        chunks - (generator of pandas dataframes) the content with doc_body,
+                 doc_description, doc_full_name, doc_status, article_id columns in
+                 article_id order. doc_full_name is the interaction title in title
+                 case. A few articles are repeated at the end of their chunk, see
+                 DUPLICATE_ARTICLE_SHARE, and a few bodies and descriptions are null
+        '''
+        rng = np.random.default_rng(self.content_seed)
+        for start in range(0, self.n_content_articles, self.content_chunk_size):
+            article_ids = np.arange(start, min(start + self.content_chunk_size,
+                                               self.n_content_articles))
+            n = len(article_ids)
+            chunk = pd.DataFrame({
+                'doc_body': random_texts(
+                    1 + rng.lognormal(np.log(self.body_words), 0.8, n).astype(int),
+                    self.vocabulary, rng),
+                'doc_description': random_texts(1 + rng.poisson(20, n), self.vocabulary, rng),
+                'doc_full_name': pd.Series(self.names[article_ids]).str.title(),
+                'doc_status': 'Live',
+                'article_id': article_ids})
+            chunk.loc[rng.random(n) < NULL_BODY_SHARE, 'doc_body'] = None
+            chunk.loc[rng.random(n) < NULL_DESCRIPTION_SHARE, 'doc_description'] = None
+            yield pd.concat([chunk, chunk[rng.random(n) < DUPLICATE_ARTICLE_SHARE]])
+
+    def write(self, interactions_path, articles_path):
+        '''
+        INPUT:
+        interactions_path - (str) csv file for the interactions, with an unnamed index
+                            column like data/user-item-interactions.csv
+        articles_path - (str) csv file for the content, like data/articles_community.csv
+        '''
+        write_chunks(self.interaction_chunks(), interactions_path, index=True)
+        write_chunks(self.content_chunks(), articles_path, index=False)
+
+
+def write_chunks(chunks, path, index):
+    '''
+    INPUT:
+    chunks - (iterable of pandas dataframes) with the same columns
+    path - (str) the csv file, written to a temporary file that replaces it at the end
+    index - (bool) write the index as the first, unnamed column
+    '''
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, header=i == 0, index=index)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    '''
+    Writes synthetic data files, e.g.
+    python -m article_recommendations.synthetic --interactions 10000000 --users 1000000
+    --articles 100000 --output-dir data/synthetic
+    '''
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--interactions', type=int, default=N_INTERACTIONS)
+    parser.add_argument('--users', type=int, default=N_USERS)
+    parser.add_argument('--articles', type=int, default=N_ARTICLES)
+    parser.add_argument('--content-articles', type=int,
+                        help='the number of content articles, scaled with --articles '
+                             'like the shipped data if not given')
+    parser.add_argument('--body-words', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default='data/synthetic')
+    args = parser.parse_args(argv)
+
+    n_content_articles = args.content_articles
+    if n_content_articles is None:
+        n_content_articles = round(args.articles * N_CONTENT_ARTICLES / N_ARTICLES)
+    os.makedirs(args.output_dir, exist_ok=True)
+    SyntheticData(args.interactions, args.users, args.articles, n_content_articles,
+                  seed=args.seed, body_words=args.body_words).write(
+        os.path.join(args.output_dir, 'user-item-interactions.csv'),
+        os.path.join(args.output_dir, 'articles_community.csv'))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,10 +2,10 @@ import pandas as pd
 import numpy as np
 import pickle
 
-df = pd.read_csv('data/user-item-interactions.csv')
-df_content = pd.read_csv('data/articles_community.csv')
-del df['Unnamed: 0']
-del df_content['Unnamed: 0']
+from article_recommendations import load_csv
+
+df = load_csv('data/user-item-interactions.csv')
+df_content = load_csv('data/articles_community.csv')
 
 
 def sol_1_test(sol_1_dict):
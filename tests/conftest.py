@@ -0,0 +1,25 @@
+import pandas as pd
+import pytest
+
+import article_recommendations as ar
+
+
+@pytest.fixture(scope='session')
+def synthetic():
+    return ar.SyntheticData(n_interactions=3000, n_users=300, n_articles=60,
+                            n_content_articles=80, seed=1)
+
+
+@pytest.fixture(scope='session')
+def df(synthetic):
+    return ar.map_emails(pd.concat(synthetic.interaction_chunks()))
+
+
+@pytest.fixture(scope='session')
+def df_content(synthetic):
+    return pd.concat(synthetic.content_chunks()).drop_duplicates('article_id')
+
+
+@pytest.fixture(scope='session', params=[True, False], ids=['sparse', 'dense'])
+def data(request, df, df_content):
+    return ar.RecommendationData.from_frames(df, df_content, sparse=request.param)
@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import article_recommendations as ar
+from article_recommendations.cache import cache_directory, read_valid_cache
+
+
+def write_interactions(path, seed):
+    synthetic = ar.SyntheticData(n_interactions=2000, n_users=200, n_articles=50,
+                                 n_content_articles=60, seed=seed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    synthetic.write(path, os.path.join(os.path.dirname(path), 'articles.csv'))
+
+
+def load_csv(path, cache_dir):
+    return ar.load_csv(path, cache_dir=cache_dir)
+
+
+def test_load_csv_reads_the_cache(tmp_path):
+    path = str(tmp_path / 'interactions.csv')
+    write_interactions(path, seed=2)
+    cache_dir = str(tmp_path / 'cache')
+
+    df = ar.load_csv(path, cache_dir=cache_dir)
+
+    pd.testing.assert_frame_equal(df, ar.load_csv(path, cache_dir=None))
+    pd.testing.assert_frame_equal(read_valid_cache(cache_directory(cache_dir, path), path), df)
+    pd.testing.assert_frame_equal(ar.load_csv(path, ['email'], cache_dir=cache_dir),
+                                  df[['email']])
+
+
+def test_concurrent_cache_writes(tmp_path):
+    path = str(tmp_path / 'interactions.csv')
+    write_interactions(path, seed=2)
+    cache_dir = str(tmp_path / 'cache')
+    expected = load_csv(path, None)
+
+    # every worker finds no cache and writes it at the same time
+    with ProcessPoolExecutor(4) as executor:
+        results = list(executor.map(load_csv, [path] * 8, [cache_dir] * 8))
+
+    for result in results:
+        pd.testing.assert_frame_equal(result, expected)
+    assert os.listdir(cache_dir) == [os.path.basename(cache_directory(cache_dir, path))]
+    pd.testing.assert_frame_equal(read_valid_cache(cache_directory(cache_dir, path), path),
+                                  expected)
+
+
+def test_files_of_the_same_name_have_their_own_caches(tmp_path):
+    paths = [str(tmp_path / 'data' / 'interactions.csv'),
+             str(tmp_path / 'data' / 'synthetic' / 'interactions.csv')]
+    for seed, path in enumerate(paths):
+        write_interactions(path, seed)
+    cache_dir = str(tmp_path / 'cache')
+    frames = [ar.load_csv(path, cache_dir=cache_dir) for path in paths]
+
+    assert len(os.listdir(cache_dir)) == 2
+    for path, df in zip(paths, frames):
+        meta_mtime = os.stat(os.path.join(cache_directory(cache_dir, path), 'meta.json'))
+        pd.testing.assert_frame_equal(ar.load_csv(path, cache_dir=cache_dir), df)
+        # read from the cache, which was not written again
+        assert os.stat(os.path.join(cache_directory(cache_dir, path),
+                                    'meta.json')).st_mtime_ns == meta_mtime.st_mtime_ns
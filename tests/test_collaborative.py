@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import article_recommendations as ar
+from article_recommendations.collaborative import batch_chunks
+
+# a few query users per chunk, so the batch functions run over several chunks
+MEMORY_BUDGET = 200000
+
+
+@pytest.fixture(scope='module')
+def user_ids(data):
+    return data.user_item.index[::7].tolist()
+
+
+def dense_user_item(data):
+    return pd.DataFrame(ar.user_item_values(data.user_item), index=data.user_item.index,
+                        columns=data.user_item.columns)
+
+
+def walk_neighbors(user_id, user_item, neighbors, m, article_rank):
+    '''The neighbor walk of the notebook, with its ties broken by article_rank'''
+    values = user_item.values
+    seen = set(np.flatnonzero(values[user_item.index.get_loc(user_id)]))
+    recs = []
+    for row in user_item.index.get_indexer(neighbors):
+        articles = np.flatnonzero(values[row])
+        for article in articles[np.argsort(article_rank[articles], kind='stable')]:
+            if article not in seen and article not in recs:
+                recs.append(article)
+            if len(recs) == m:
+                return [str(user_item.columns[rec]) for rec in recs]
+    return [str(user_item.columns[rec]) for rec in recs]
+
+
+def test_memory_budget_makes_several_chunks(data, user_ids):
+    chunks = list(batch_chunks(len(user_ids), data.user_item, MEMORY_BUDGET))
+
+    assert len(chunks) > 2
+    assert np.concatenate([np.arange(len(user_ids))[chunk] for chunk in chunks]).tolist() == \
+        list(range(len(user_ids)))
+
+
+def test_batch_find_similar_users(data, user_ids):
+    neighbors = ar.batch_find_similar_users(user_ids, data.user_item, k=20,
+                                            memory_budget=MEMORY_BUDGET)
+
+    for user_id, row in zip(user_ids, neighbors):
+        assert row.tolist() == ar.find_similar_users(user_id, data.user_item)[:20]
+
+
+def test_batch_top_sorted_users(data, user_ids):
+    neighbor_ids, similarity, num_interactions = ar.batch_top_sorted_users(
+        user_ids, data.user_item, k=20, memory_budget=MEMORY_BUDGET)
+
+    for i, user_id in enumerate(user_ids):
+        neighbors_df = ar.get_top_sorted_users(user_id, data.user_item, k=20)
+        assert neighbor_ids[i].tolist() == neighbors_df['neighbor_id'].tolist()
+        assert similarity[i].tolist() == neighbors_df['similarity'].tolist()
+        assert num_interactions[i].tolist() == neighbors_df['num_interactions'].tolist()
+
+
+@pytest.mark.parametrize('m', [1, 10, 80])
+def test_batch_user_user_recs(data, user_ids, m):
+    recs = ar.batch_user_user_recs(user_ids, m, user_item=data.user_item,
+                                   memory_budget=MEMORY_BUDGET)
+
+    for user_id, row in zip(user_ids, recs):
+        expected = ar.user_user_recs(user_id, m, user_item=data.user_item)
+        assert row.tolist() == expected + [None] * (m - len(expected))
+
+
+@pytest.mark.parametrize('m', [1, 10, 80])
+def test_batch_user_user_recs_part2(data, user_ids, m):
+    recs = ar.batch_user_user_recs_part2(user_ids, m, df=data.df, user_item=data.user_item,
+                                         memory_budget=MEMORY_BUDGET)
+
+    for user_id, row in zip(user_ids, recs):
+        expected, _ = ar.user_user_recs_part2(user_id, m, df=data.df, user_item=data.user_item,
+                                              article_titles=data.article_titles)
+        assert row.tolist() == expected + [None] * (m - len(expected))
+
+
+@pytest.mark.parametrize('m', [1, 10, 80])
+def test_user_user_recs_walks_the_neighbors(data, user_ids, m):
+    user_item = dense_user_item(data)
+    article_rank = np.arange(user_item.shape[1])
+
+    for user_id in user_ids:
+        # closest first, ties in user_id order
+        similarity = user_item.dot(user_item.loc[user_id]).drop(index=user_id)
+        neighbors = similarity.sort_values(ascending=False, kind='stable').index
+        assert ar.user_user_recs(user_id, m, user_item=data.user_item) == \
+            walk_neighbors(user_id, user_item, neighbors, m, article_rank)
+
+
+@pytest.mark.parametrize('m', [1, 10, 80])
+def test_user_user_recs_part2_walks_the_neighbors(data, user_ids, m):
+    user_item = dense_user_item(data)
+    article_rank = ar.get_article_ranks(user_item.columns, data.df)
+
+    for user_id in user_ids:
+        neighbors_df = pd.DataFrame({
+            'similarity': user_item.dot(user_item.loc[user_id]),
+            'num_interactions': user_item.sum(axis=1)}).drop(index=user_id)
+        neighbors = neighbors_df.sort_values(['similarity', 'num_interactions'],
+                                             ascending=False, kind='stable').index
+        recs, _ = ar.user_user_recs_part2(user_id, m, df=data.df, user_item=data.user_item,
+                                          article_titles=data.article_titles)
+        assert recs == walk_neighbors(user_id, user_item, neighbors, m, article_rank)
+
+
+def test_sparse_and_dense_agree(df):
+    user_ids = np.unique(df['user_id'])[::7].tolist()
+    sparse = ar.RecommendationData.from_frames(df, sparse=True)
+    dense = ar.RecommendationData.from_frames(df, sparse=False)
+
+    for user_id in user_ids:
+        assert sparse.find_similar_users(user_id) == dense.find_similar_users(user_id)
+        pd.testing.assert_frame_equal(sparse.get_top_sorted_users(user_id),
+                                      dense.get_top_sorted_users(user_id), check_dtype=False)
+        assert sparse.get_user_articles(user_id) == dense.get_user_articles(user_id)
+        assert sparse.user_user_recs(user_id) == dense.user_user_recs(user_id)
+        assert sparse.user_user_recs_part2(user_id) == dense.user_user_recs_part2(user_id)
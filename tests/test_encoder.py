@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+import article_recommendations as ar
+
+
+def test_ids_in_order_of_first_appearance():
+    encoder = ar.EmailEncoder()
+
+    user_ids = encoder.encode(['b@x', 'a@x', None, 'b@x', np.nan])
+
+    assert user_ids.tolist() == [1, 2, 3, 1, 3]
+    assert encoder.decode([1, 2]).tolist() == ['b@x', 'a@x']
+    assert pd.isna(encoder.decode([3])[0])
+
+
+def test_ids_are_stable_across_save_and_load(tmp_path):
+    path = str(tmp_path / 'emails.npz')
+    encoder = ar.EmailEncoder()
+    first = encoder.encode(['b@x', 'a@x', None, 'ä' * 300 + '@x'])
+    encoder.save(path)
+
+    loaded = ar.EmailEncoder.load(path)
+    pd.testing.assert_index_equal(loaded.emails, encoder.emails, exact=False)
+
+    # the known emails in another order, with new ones between them
+    user_ids = loaded.encode(['c@x', 'ä' * 300 + '@x', None, 'a@x', 'd@x', 'b@x', 'c@x'])
+    assert user_ids.tolist() == [5, first[3], first[2], first[1], 6, first[0], 5]
+
+    loaded.save(path)
+    assert ar.EmailEncoder.load(path).encode(['d@x', 'b@x']).tolist() == [6, 1]
+
+
+def test_load_of_a_missing_file(tmp_path):
+    encoder = ar.EmailEncoder.load(str(tmp_path / 'emails.npz'))
+
+    assert len(encoder) == 0
+    assert encoder.encode(['a@x']).tolist() == [1]
+
+
+def test_map_emails_keeps_the_ids_of_an_encoder(synthetic):
+    log = pd.concat(synthetic.interaction_chunks(), ignore_index=True)
+    encoder = ar.EmailEncoder()
+    first = ar.map_emails(log.iloc[:1000], encoder)
+    n_known = len(encoder)
+
+    # a later log, read in another order
+    later = ar.map_emails(log.iloc[::-1], encoder)
+
+    pd.testing.assert_series_equal(ar.map_emails(log.iloc[:1000], encoder)['user_id'],
+                                   first['user_id'])
+    assert pd.Index(encoder.decode(later['user_id'])).equals(pd.Index(log['email'].values[::-1]))
+    assert len(encoder) == log['email'].nunique(dropna=False)
+    assert (later['user_id'][~log['email'].iloc[::-1].isin(encoder.emails[:n_known])]
+            > n_known).all()
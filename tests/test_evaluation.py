@@ -0,0 +1,12 @@
+import article_recommendations as ar
+
+
+def test_evaluate_scores_als_the_same_every_time(df):
+    df = df.drop(columns='interacted', errors='ignore')
+    df_train, df_test = df.iloc[:2400], df.iloc[2400:]
+    configs = [{'recommender': 'als', 'params': {'k': 5, 'iterations': 3}}]
+
+    runs = [ar.evaluate(configs, df_train, df_test, n_workers=n_workers)[1]
+            for n_workers in (1, 2)]
+
+    assert runs[0].equals(runs[1])
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import article_recommendations as ar
+from article_recommendations.evaluation import top_unseen
+from article_recommendations.factorization import model_generations
+
+
+@pytest.fixture
+def models(data):
+    return [ar.SVDModel.fit(data.user_item, k=k) for k in (3, 4, 5)]
+
+
+def load_during(monkeypatch, path, saves):
+    '''
+    SVDModel.load of path with saves called after it read the first file
+    '''
+    np_load = np.load
+
+    def load(*args, **kwargs):
+        result = np_load(*args, **kwargs)
+        while saves:
+            saves.pop(0)()
+        return result
+    monkeypatch.setattr(np, 'load', load)
+    model = ar.SVDModel.load(path)
+    monkeypatch.setattr(np, 'load', np_load)
+    return model
+
+
+def test_load_while_saving_reads_one_model(tmp_path, monkeypatch, models):
+    path = str(tmp_path / 'model')
+    models[0].save(path)
+
+    loaded = load_during(monkeypatch, path, [lambda: models[1].save(path)])
+
+    # the model the load started on is kept until the next save
+    assert loaded.u.shape == models[0].u.shape and loaded.vt.shape == models[0].vt.shape
+    np.testing.assert_array_equal(loaded.s, models[0].s)
+    assert len(model_generations(path)) == 2
+
+
+def test_load_while_saving_twice_reads_the_newest_model(tmp_path, monkeypatch, models):
+    path = str(tmp_path / 'model')
+    models[0].save(path)
+
+    loaded = load_during(monkeypatch, path, [lambda: models[1].save(path),
+                                             lambda: models[2].save(path)])
+
+    np.testing.assert_array_equal(loaded.s, models[2].s)
+    np.testing.assert_array_equal(loaded.vt, models[2].vt)
+    assert len(model_generations(path)) == 2
+
+
+def test_load_of_a_missing_model(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ar.SVDModel.load(str(tmp_path / 'model'))
+
+
+def test_fold_in_of_a_training_user(data):
+    model = ar.SVDModel.fit(data.user_item, k=10)
+    user_id = data.user_item.index[5]
+    articles = data.get_user_articles(user_id)[0]
+
+    scores, recs = model.fold_in(articles, m=10)
+    predicted = model.predict([user_id])[0]
+
+    # the projection of a training row gives back its factors
+    np.testing.assert_allclose(scores, predicted, atol=1e-8)
+    np.testing.assert_allclose(model.fold_in_factors([articles])[0],
+                               model.u[data.user_item.index.get_loc(user_id)], atol=1e-8)
+    assert recs == top_unseen(predicted[None, :], data.user_item, np.array([5]), 10)[0]
+    assert not set(recs) & set(articles)
+
+
+def test_fold_in_of_an_empty_history(data):
+    model = ar.SVDModel.fit(data.user_item, k=10)
+
+    scores, recs = model.batch_fold_in([[], ['123456.0']], m=10)
+
+    assert recs == [[], []]
+    assert not scores.any()
+    assert not model.fold_in_factors([[]]).any()
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import article_recommendations as ar
+from article_recommendations.ranking import get_popularity_table
+
+
+def split_log(df):
+    '''
+    A first log without every third user and a few articles, and batches holding
+    the rest, so the batches bring new users and articles that sort between the
+    known ones
+    '''
+    articles = df['article_id'].unique()[::5]
+    later = (df['user_id'] % 3 == 0) | df['article_id'].isin(articles)
+    rest = df[later]
+    return df[~later], [rest.iloc[i::3] for i in range(3)]
+
+
+@pytest.fixture
+def store_and_log(df):
+    first, batches = split_log(df.drop(columns='interacted', errors='ignore'))
+    store = ar.InteractionStore(first)
+    for batch in batches:
+        store.append(batch)
+    return store, pd.concat([first] + batches, ignore_index=True)
+
+
+def test_append_matches_a_rebuild(store_and_log):
+    store, log = store_and_log
+    rebuilt = ar.create_sparse_user_item_matrix(log)
+
+    assert store.version == store.user_item.version == 3
+    pd.testing.assert_index_equal(store.user_item.index, rebuilt.index)
+    pd.testing.assert_index_equal(store.user_item.columns, rebuilt.columns)
+    assert (store.user_item.matrix != rebuilt.matrix).nnz == 0
+    np.testing.assert_array_equal(ar.get_interaction_counts(store.user_item),
+                                  ar.get_interaction_counts(rebuilt))
+
+
+def test_append_counts_the_articles(store_and_log):
+    store, log = store_and_log
+    counts = log['article_id'].value_counts()
+
+    np.testing.assert_array_equal(store.article_counts, counts[store.article_ids].values)
+    assert store.article_titles == ar.create_article_titles(log)
+
+
+def test_append_popularity_matches_a_rebuild(store_and_log):
+    store, log = store_and_log
+
+    pd.testing.assert_frame_equal(store.popularity, ar.create_popularity_table(log),
+                                  check_dtype=False)
+    pd.testing.assert_frame_equal(store.df, log)
+    assert get_popularity_table(store.df) is store.popularity
+
+
+def test_append_recommends_like_a_rebuild(store_and_log):
+    store, log = store_and_log
+    rebuilt = ar.RecommendationData.from_frames(log, sparse=True)
+
+    for user_id in rebuilt.user_item.index[::25]:
+        assert ar.user_user_recs_part2(user_id, 10, df=store.df, user_item=store.user_item,
+                                       article_titles=store.article_titles) == \
+            rebuilt.user_user_recs_part2(user_id, 10)
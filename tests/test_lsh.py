@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+
+import article_recommendations as ar
+from article_recommendations.lsh import MINHASH_PRIME, minhash_signatures
+
+
+def exact_recall(index, user_item, user_ids, k):
+    '''The recall of index measured without MinHashLSH.recall'''
+    values = ar.user_item_values(user_item)
+    recalls = []
+    for user_id in user_ids:
+        row = user_item.index.get_loc(user_id)
+        similarities = values @ values[row]
+        similarities[row] = -1
+        kth = np.sort(similarities)[::-1][k - 1]
+        n_exact = min(k, np.count_nonzero(similarities > 0))
+        if n_exact == 0:
+            continue
+        found = similarities[user_item.index.get_indexer(index.find_similar_users(user_id, k))]
+        recalls.append(np.count_nonzero((found >= kth) & (found > 0)) / n_exact)
+    return np.mean(recalls)
+
+
+def test_recall(data):
+    user_ids = data.user_item.index
+    recalls = [ar.MinHashLSH(data.user_item, n_bands, n_rows, random_state=0).recall(user_ids)
+               for n_bands, n_rows in [(4, 4), (8, 2), (32, 2), (64, 1)]]
+
+    # more bands and fewer rows per band find more of the exact neighbors
+    assert recalls == sorted(recalls)
+    assert recalls[-1] > 0.95
+    index = ar.MinHashLSH(data.user_item, random_state=0)
+    assert index.recall(user_ids) == pytest.approx(exact_recall(index, data.user_item,
+                                                                user_ids, 10))
+
+
+def test_recall_of_copied_users(df):
+    # a copy of every tenth user, the copies are each other's closest neighbor
+    originals = df[df['user_id'] % 10 == 0]
+    copies = originals.assign(user_id=originals['user_id'] + df['user_id'].max())
+    user_item = ar.create_sparse_user_item_matrix(pd.concat([df, copies]))
+    index = ar.MinHashLSH(user_item, random_state=0)
+
+    assert index.recall(originals['user_id'].unique(), k=1) == 1.0
+    for user_id in originals['user_id'].unique():
+        # equal signatures share every bucket
+        assert user_id + df['user_id'].max() in index.find_similar_users(user_id)
+
+
+def test_candidates_share_a_bucket(data):
+    index = ar.MinHashLSH(data.user_item, n_bands=8, n_rows=2, random_state=1)
+    signed = ar.get_interaction_counts(data.user_item) > 0
+
+    for row in range(0, data.user_item.shape[0], 13):
+        shared = (index.keys == index.keys[row]).any(axis=1) & signed
+        shared[row] = False
+        expected = np.flatnonzero(shared) if signed[row] else np.empty(0, dtype=int)
+        np.testing.assert_array_equal(index.candidate_rows(row), expected)
+
+
+def test_minhash_signatures():
+    rng = np.random.default_rng(0)
+    matrix = csr_matrix(rng.random((30, 50)) < 0.1)
+    a = rng.integers(1, MINHASH_PRIME, 20)
+    b = rng.integers(0, MINHASH_PRIME, 20)
+
+    signatures = minhash_signatures(matrix, a, b, memory_budget=1000)
+
+    hashes = (a[:, None] * np.arange(50) + b[:, None]) % MINHASH_PRIME
+    for user, row in enumerate(matrix.toarray()):
+        expected = hashes[:, row].min(axis=1) if row.any() else MINHASH_PRIME
+        np.testing.assert_array_equal(signatures[:, user], expected)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import article_recommendations as ar
+from article_recommendations.matrix import top_k_indices
+
+
+def test_top_k_indices_breaks_ties_by_column():
+    scores = np.array([[1.0, 3.0, 2.0, 3.0, 0.0],
+                       [5.0, 5.0, 5.0, 1.0, 5.0]])
+
+    np.testing.assert_array_equal(top_k_indices(scores, 3), [[1, 3, 2], [0, 1, 2]])
+    np.testing.assert_array_equal(top_k_indices(scores, 10), [[1, 3, 2, 0, 4],
+                                                              [0, 1, 2, 4, 3]])
+
+
+@pytest.mark.parametrize('k', [0, -1])
+def test_top_k_indices_without_columns(k):
+    top_idx = top_k_indices(np.ones((2, 60)), k)
+
+    assert top_idx.shape == (2, 0)
+
+
+def test_no_recommendations_for_m_0(data):
+    user_id = data.user_item.index[0]
+
+    assert data.user_user_recs(user_id, 0) == []
+    assert data.user_user_recs_part2(user_id, 0) == ([], [])
+    assert len(data.find_similar_users(user_id, k=0)) == 0
+    assert data.make_content_recs(['1.0'], 0) == ([], [])
+    assert ar.SVDModel.fit(data.user_item, k=5).fold_in(['1.0'], m=0)[1] == []
@@ -0,0 +1,109 @@
+import numpy as np
+
+import article_recommendations as ar
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Counter:
+    '''A recommender that counts its calls'''
+    def __init__(self):
+        self.calls = []
+
+    def recs(self, user_id, m=10, *, df=None, **kwargs):
+        self.calls.append((user_id, m))
+        return [user_id] * m
+
+
+def test_lru_eviction():
+    cache = ar.ResultCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    # b is the least recently used now
+    cache.put('c', 3)
+
+    assert cache.get('b') is ar.MISSING
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'evictions': 1, 'expirations': 0,
+                             'size': 2, 'hit_rate': 0.75}
+
+
+def test_none_is_a_result():
+    cache = ar.ResultCache()
+    calls = []
+
+    for _ in range(2):
+        assert cache.get_or_compute('a', lambda: calls.append(1)) is None
+    assert len(calls) == 1
+
+
+def test_ttl():
+    clock = Clock()
+    cache = ar.ResultCache(ttl=10, clock=clock)
+    cache.put('a', 1)
+
+    clock.now = 9.9
+    assert cache.get('a') == 1
+    clock.now = 10
+    assert cache.get('a') is ar.MISSING
+    assert cache.stats()['expirations'] == 1 and len(cache) == 0
+    cache.put('a', 2)
+    assert cache.get('a') == 2
+
+
+def test_new_version_misses():
+    cache = ar.ResultCache()
+    counter = Counter()
+    version = [0]
+    recs = cache.wrap(counter.recs, lambda: version[0])
+
+    recs(1)
+    recs(1)
+    version[0] += 1
+    recs(1)
+
+    assert counter.calls == [(1, 10), (1, 10)]
+
+
+def test_equivalent_calls_share_a_key():
+    cache = ar.ResultCache()
+    counter = Counter()
+    recs = cache.wrap(counter.recs)
+
+    assert recs(1) == recs(1, 10) == recs(user_id=1, m=10) == recs(np.int64(1), m=10)
+    recs(1, 5)
+    recs(2)
+    assert counter.calls == [(1, 10), (1, 5), (2, 10)]
+
+
+def test_arguments_are_part_of_the_key():
+    cache = ar.ResultCache()
+    counter = Counter()
+    recs = cache.wrap(counter.recs)
+    df, other_df = {'a': 1}, {'a': 1}
+
+    recs(1, df=df)
+    recs(1, df=df)
+    # equal but not the same data
+    recs(1, df=other_df)
+    recs(1, df=df, k=[1, 2])
+    recs(1, df=df, k=np.array([1, 2]))
+    recs(1, df=df, k=[1, 3])
+
+    assert len(counter.calls) == 4
+
+
+def test_methods_of_different_objects_have_their_own_results():
+    cache = ar.ResultCache()
+    counters = [Counter(), Counter()]
+
+    for counter in counters:
+        cache.wrap(counter.recs)(1)
+    assert [len(counter.calls) for counter in counters] == [1, 1]
@@ -0,0 +1,93 @@
+import asyncio
+import functools
+
+import pytest
+
+from article_recommendations.server import (MAX_BODY_SIZE, MAX_HEADERS, HTTPError, MicroBatcher,
+                                            RecommendationServer, ServingModel, run_grouped)
+
+
+@pytest.fixture(scope='module')
+def serving_model(data):
+    return ServingModel.from_data(data, svd_k=10)
+
+
+def test_server_rejects_large_m(serving_model):
+    async def request(target):
+        server = RecommendationServer(lambda: serving_model, max_m=20)
+        await server.reload()
+        return await server.respond('GET', target)
+
+    with pytest.raises(HTTPError) as error:
+        asyncio.run(request('/recommendations/popular?m=10000000000'))
+    assert error.value.status == 400
+
+    status, body = asyncio.run(request('/recommendations/popular?m=20'))
+    assert status == 200 and len(body['article_ids']) == 20
+
+
+class FailingModel(ServingModel):
+    def user_user_recs(self, user_ids, m):
+        raise RuntimeError('failed')
+
+
+def test_server_failing_group_fails_only_its_requests(data, serving_model):
+    failing = FailingModel(data.df, data.user_item, data.article_titles)
+    user_ids = data.user_item.index[:2].tolist()
+
+    async def submit():
+        batcher = MicroBatcher(functools.partial(run_grouped, 'user_user_recs'),
+                               max_batch_size=8, max_delay=0.01)
+        futures = [batcher.submit((failing, user_ids[0], 5)),
+                   batcher.submit((serving_model, user_ids[0], 5)),
+                   batcher.submit((serving_model, user_ids[1], 5))]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    results = asyncio.run(submit())
+
+    assert isinstance(results[0], RuntimeError)
+    assert results[1:] == serving_model.user_user_recs(user_ids, 5)
+
+
+async def exchange(server, request):
+    '''
+    Sends request on a new connection to server and reads until it is closed,
+    or for at most a second
+    '''
+    listener = await server.start(port=0)
+    async with listener:
+        reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+        writer.write(request)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 1)
+        writer.close()
+    return response
+
+
+def test_server_keeps_the_connection_open(serving_model):
+    request = b'GET /recommendations/popular?m=3 HTTP/1.1\r\n\r\n'
+    response = asyncio.run(exchange(RecommendationServer(lambda: serving_model),
+                                    request * 2 + b'GET /stats HTTP/1.0\r\n\r\n'))
+
+    assert response.count(b'HTTP/1.1 200 OK') == 3
+
+
+@pytest.mark.parametrize('request_head, status', [
+    ('Content-Length: {}\r\n'.format(MAX_BODY_SIZE + 1), b'413'),
+    ('X-Header: 1\r\n' * (MAX_HEADERS + 1), b'431')], ids=['body', 'headers'])
+def test_server_refuses_large_requests(serving_model, request_head, status):
+    request = 'POST /reload HTTP/1.1\r\n{}\r\n'.format(request_head).encode()
+    # the body is never read, the server closes the connection after the answer
+    response = asyncio.run(exchange(RecommendationServer(lambda: serving_model), request))
+
+    assert response.startswith(b'HTTP/1.1 ' + status)
+    assert b'Connection: close' in response
+    assert response.count(b'HTTP/1.1') == 1
+
+
+def test_server_skips_the_body(serving_model):
+    request = (b'POST /reload HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello'
+               b'GET /stats HTTP/1.1\r\nConnection: close\r\n\r\n')
+    response = asyncio.run(exchange(RecommendationServer(lambda: serving_model), request))
+
+    assert response.count(b'HTTP/1.1 200 OK') == 2
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import article_recommendations as ar
+from article_recommendations.synthetic import MAX_USER_INTERACTIONS, activity_counts
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_activity_counts_stay_under_the_cap(seed):
+    counts = activity_counts(45993, 5149, np.random.default_rng(seed))
+
+    assert counts.sum() == 45993
+    assert counts.min() >= 1 and counts.max() <= MAX_USER_INTERACTIONS
+
+
+def test_activity_counts_at_the_limits():
+    rng = np.random.default_rng(0)
+
+    assert (activity_counts(10, 10, rng) == 1).all()
+    assert (activity_counts(10 * MAX_USER_INTERACTIONS, 10, rng) == MAX_USER_INTERACTIONS).all()
+    with pytest.raises(ValueError):
+        activity_counts(10 * MAX_USER_INTERACTIONS + 1, 10, rng)
+
+
+def test_interactions_have_n_users():
+    synthetic = ar.SyntheticData(n_interactions=3000, n_users=300, n_articles=60,
+                                 n_content_articles=80, seed=3, chunk_size=700)
+    df = pd.concat(synthetic.interaction_chunks())
+
+    assert len(df) == 3000 and df.index.is_unique
+    # the null email is one of the users
+    assert ar.map_emails(df)['user_id'].nunique() == 300
+    assert df['email'].isna().any()